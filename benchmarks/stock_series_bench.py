@@ -0,0 +1,81 @@
+"""Micro-benchmark for the stock_price series pipeline.
+
+Compares the per-row cost of the original dict/strptime loop with the
+vectorized pandas/NumPy pipeline used by stock_price, on synthetic bars.
+
+Usage: uv run benchmarks/stock_series_bench.py
+"""
+import datetime
+import os
+import sys
+import timeit
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "servers"))
+from stock_server import format_percentage_change, format_price_lines  # noqa: E402
+
+SIZES = (10_000, 100_000)
+REPEAT = 5
+
+
+def make_bars(rows: int) -> pd.DataFrame:
+  """Synthetic daily bars with a sprinkling of NaN closes"""
+  rng = np.random.default_rng(42)
+  index = pd.date_range("1900-01-01", periods=rows, freq="D", tz="America/New_York")
+  close = 100 + rng.standard_normal(rows).cumsum()
+  close[rng.integers(0, rows, rows // 100)] = np.nan
+  return pd.DataFrame({"close": close}, index=index)
+
+
+def legacy_pipeline(timestamps: list, close_prices: list, start_date: str, end_date: str) -> str:
+  """The row-by-row loop stock_price used before vectorization"""
+  price_data = {}
+  for i, ts in enumerate(timestamps):
+    if i < len(close_prices) and close_prices[i] is not None:
+      date_str = datetime.datetime.fromtimestamp(ts).strftime('%Y-%m-%d')
+      price_data[date_str] = close_prices[i]
+  filtered_data = {}
+  start = datetime.datetime.strptime(start_date, '%Y-%m-%d')
+  end = datetime.datetime.strptime(end_date, '%Y-%m-%d')
+  for d in price_data:
+    curr_date = datetime.datetime.strptime(d, '%Y-%m-%d')
+    if start <= curr_date <= end:
+      filtered_data[d] = price_data[d]
+  price_points = list(filtered_data.items())
+  percentage_change = ""
+  if len(price_points) >= 2:
+    change = ((price_points[-1][1] - price_points[0][1]) / price_points[0][1]) * 100
+    percentage_change = f"\nPrice changed {'up' if change >= 0 else 'down'} {abs(change):.2f}% over this period."
+  return '\n'.join([f"{d}: ${filtered_data[d]:.2f}" for d in sorted(filtered_data.keys())]) + percentage_change
+
+
+def vectorized_pipeline(frame: pd.DataFrame, start: pd.Timestamp, end: pd.Timestamp) -> str:
+  """Date filtering, NaN dropping, percent change and formatting as vector operations"""
+  ts = frame.index.asi8
+  lo, hi = np.searchsorted(ts, [start.value, end.value], side="left")
+  closes = frame["close"].iloc[lo:hi].dropna()
+  return format_price_lines(closes) + format_percentage_change(closes, "over this period")
+
+
+def main():
+  print(f"{'rows':>8} {'legacy us/row':>14} {'vectorized us/row':>18} {'speedup':>8}")
+  for rows in SIZES:
+    frame = make_bars(rows)
+    timestamps = (frame.index.asi8 // 1_000_000_000).tolist()
+    close_prices = frame["close"].tolist()
+    start_date = frame.index[0].strftime('%Y-%m-%d')
+    end_date = frame.index[-1].strftime('%Y-%m-%d')
+    start = frame.index[0]
+    end = frame.index[-1] + pd.Timedelta(days=1)
+
+    legacy = min(timeit.repeat(lambda: legacy_pipeline(timestamps, close_prices, start_date, end_date),
+                               number=1, repeat=REPEAT))
+    vectorized = min(timeit.repeat(lambda: vectorized_pipeline(frame, start, end),
+                                   number=1, repeat=REPEAT))
+    print(f"{rows:>8} {legacy / rows * 1e6:>14.3f} {vectorized / rows * 1e6:>18.3f} {legacy / vectorized:>7.1f}x")
+
+
+if __name__ == "__main__":
+  main()
@@ -1,111 +1,755 @@
 import argparse
+import base64
+import csv
+import hashlib
+import io
 import sqlite3
 from contextlib import asynccontextmanager
+from collections import OrderedDict
 from collections.abc import AsyncIterator
 import logging
 import os
+import re
+import time
 import asyncio
+import json
+import anyio
 from fastmcp import Context, FastMCP
+from fastmcp.tools.tool import ToolResult
+from mcp.types import BlobResourceContents, EmbeddedResource, TextContent
+from sqlite_pool import SQLitePool
+try:
+  import pyarrow as pa
+except ImportError:  # optional, only needed for output_format="arrow"
+  pa = None
 
 # Set up logging
 logging.basicConfig(level=logging.DEBUG)
 logger = logging.getLogger("nl2sql")
 
 # SQLite database file path
-SQLITE_DB_PATH = "data/chinook.db"
+SQLITE_DB_PATH = os.getenv("SQLITE_DB_PATH", "data/chinook.db")
+# Read-only connections in the pool, reads beyond this many wait for a free connection
+SQLITE_READERS = int(os.getenv("SQLITE_READERS", str(os.cpu_count() or 4)))
+# Per-connection pragmas: memory-map up to 256 MiB of the file, 16 MiB page cache
+SQLITE_PRAGMAS = {
+  "mmap_size": 256 * 1024 * 1024,
+  "cache_size": -16 * 1024,
+  "temp_store": "MEMORY",
+}
+# Opt-in: serve everything from an in-memory copy of the database, checkpointed back to the file
+SQLITE_IN_MEMORY = os.getenv("SQLITE_IN_MEMORY", "0") == "1"
+SQLITE_CHECKPOINT_INTERVAL = float(os.getenv("SQLITE_CHECKPOINT_INTERVAL", "60"))  # seconds
+SQLITE_WRITE_QUEUE = 1000  # queued writes before execute_nonquery callers wait
+SQLITE_WRITE_BATCH = 200   # max writes committed in one transaction
+TRANSACTION_CONTROL = re.compile(r"^\s*(BEGIN|COMMIT|END|ROLLBACK|SAVEPOINT|RELEASE|VACUUM)\b", re.IGNORECASE)
+
+# query_sql paging and response budgets
+QUERY_PAGE_SIZE = 100
+QUERY_MAX_PAGE_SIZE = 1000
+QUERY_MAX_RESPONSE_BYTES = 64 * 1024  # a page ends early once its rows reach this size
+QUERY_MAX_VALUE_CHARS = 2000          # longer text values are truncated
+QUERY_FETCH_CHUNK = 256               # rows per fetchmany() call
+QUERY_TIMEOUT = float(os.getenv("QUERY_TIMEOUT", "10"))  # default seconds before a query is stopped
+QUERY_MAX_TIMEOUT = 120
+QUERY_MAX_STEPS = int(os.getenv("QUERY_MAX_STEPS", "0"))  # optional VM instruction budget, 0 for none
+QUERY_OUTPUT_FORMATS = ("rows", "columns", "csv", "arrow")
+ARROW_STREAM_MIME_TYPE = "application/vnd.apache.arrow.stream"
+
+# bulk_insert limits
+BULK_INSERT_CHUNK_ROWS = 1000   # rows per executemany() call, each chunk is committed on its own
+BULK_INSERT_MAX_ROWS = 100_000  # rows accepted by one call
+
+# Query result cache settings
+QUERY_CACHE_MAX_BYTES = int(os.getenv("QUERY_CACHE_MAX_BYTES", str(32 * 1024 * 1024)))
+SQL_WHITESPACE = re.compile(r"""('(?:[^']|'')*'|"(?:[^"]|"")*")|\s+""")
+# Functions with varying results, the CURRENT_* keywords, 'now', and the date and time
+# functions called without a time value (they default to now)
+SQL_NONDETERMINISTIC = re.compile(r"\b(random|randomblob|changes|total_changes|last_insert_rowid)\s*\(|'now'|"
+                                  r"\bCURRENT_(TIMESTAMP|DATE|TIME)\b|"
+                                  r"\b(date|time|datetime|julianday|unixepoch)\s*\(\s*\)|"
+                                  r"\bstrftime\s*\(\s*(?:'(?:[^']|'')*'|\w+)\s*\)",
+                                  re.IGNORECASE)
+
+# Query plan advisor and slow query log settings
+SLOW_QUERY_MS = 100          # query_sql executions at least this slow are recorded by shape
+SLOW_QUERY_MAX_SHAPES = 100
+SLOW_QUERY_MIN_COUNT = 3     # a shape seen this often is a recurring pattern worth indexing
+INDEX_MAX_COLUMNS = 5        # wider suggestions are not made covering
+SQL_TABLE_REF = re.compile(r"\b(?:FROM|JOIN)\s+(.+?)(?=\bWHERE\b|\bGROUP\b|\bORDER\b|\bLIMIT\b|\bHAVING\b|\bON\b|"
+                           r"\bUSING\b|\b(?:LEFT|RIGHT|FULL|INNER|CROSS|NATURAL|OUTER)?\s*JOIN\b|\bUNION\b|\)|$)",
+                           re.IGNORECASE | re.DOTALL)
+SQL_COMPARISON = re.compile(r"(?:\b(\w+)\.)?\b(\w+)\b\s*(==|=|<=|>=|<>|!=|<|>|\bIN\b|\bIS\b|\bBETWEEN\b)"
+                            r"\s*(?:(?:\b(\w+)\.)?\b([A-Za-z_]\w*)\b(?!\s*\())?", re.IGNORECASE)
+SQL_COLUMN_REF = re.compile(r"(?:\b(\w+)\.)?\b(\w+)\b")
+SQL_LITERAL = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
 
 
 @asynccontextmanager
 async def app_lifespan(server: FastMCP) -> AsyncIterator[dict]:
   """Manage application lifecycle with type-safe context for SQLite"""
-  logger.debug("Initializing SQLite database connection")
-  conn = None
+  logger.debug("Initializing SQLite connection pool")
+  pool = None
+  cache = ResultCache(QUERY_CACHE_MAX_BYTES)
+  catalog = SchemaCatalog()
+  slow_log = SlowQueryLog(SLOW_QUERY_MS, SLOW_QUERY_MAX_SHAPES)
   try:
-    def connect_db():
-      logger.debug(f"Connecting to SQLite database at {SQLITE_DB_PATH}")
-      return sqlite3.connect(SQLITE_DB_PATH, check_same_thread=False)
-    loop = asyncio.get_event_loop()
-    conn = await loop.run_in_executor(None, connect_db)
-    logger.debug("SQLite database connection established successfully")
-    yield {"conn": conn}
+    logger.debug(f"Connecting to SQLite database at {SQLITE_DB_PATH} with {SQLITE_READERS} readers"
+                 f"{' from an in-memory snapshot' if SQLITE_IN_MEMORY else ''}")
+    # In memory there is no WAL: a commit waits for the longest running read, and reads
+    # starting meanwhile wait for the commit, so wait out the longest query deadline
+    busy_timeout = QUERY_MAX_TIMEOUT + 5 if SQLITE_IN_MEMORY else 5.0
+    pool = SQLitePool(SQLITE_DB_PATH, readers=SQLITE_READERS, timeout=busy_timeout, pragmas=SQLITE_PRAGMAS,
+                      write_queue=SQLITE_WRITE_QUEUE, write_batch=SQLITE_WRITE_BATCH,
+                      in_memory=SQLITE_IN_MEMORY, checkpoint_interval=SQLITE_CHECKPOINT_INTERVAL)
+    await pool.open()
+    logger.debug("SQLite connection pool established successfully")
+    await catalog.get(pool)
+    logger.debug("Schema catalog built")
   except Exception as e:
     logger.error(
         f"SQLite connection error: {type(e).__name__}: {str(e)}", exc_info=True)
-    yield {"conn": None}
+    pool = None
+  try:
+    yield {"pool": pool, "cache": cache, "catalog": catalog, "slow_log": slow_log}
   finally:
-    if conn:
-      logger.debug("Closing SQLite database connection")
-      await asyncio.get_event_loop().run_in_executor(None, conn.close)
+    if pool:
+      logger.debug("Closing SQLite connection pool")
+      # Shielded: shutdown may already be cancelled, but queued writes and the
+      # final in-memory checkpoint must still reach the file
+      with anyio.CancelScope(shield=True):
+        await pool.close()
+
+class ResultCache:
+  """LRU cache of query results, bounded by their approximate size in bytes.
+
+  Entries are keyed by whitespace-normalized SQL plus the paging arguments
+  and dropped all at once whenever the database changes: after every
+  execute_nonquery commit, and when `PRAGMA data_version` shows that another
+  connection or process committed. A result is only stored if no change
+  happened while it was being read.
+  """
+
+  def __init__(self, max_bytes: int):
+    self.max_bytes = max_bytes
+    self._entries = OrderedDict()  # key -> (result, size)
+    self.bytes = 0
+    self.generation = 0
+    self._data_version = None
+    self.hits = 0
+    self.misses = 0
+    self.evictions = 0
+    self.invalidations = 0
+
+  @staticmethod
+  def key(query: str, *params) -> tuple:
+    """Cache key for a query: runs of whitespace outside string literals collapse to one space"""
+    normalized = SQL_WHITESPACE.sub(lambda m: m.group(1) or ' ', query).strip().rstrip(';').strip()
+    return (normalized,) + params
+
+  @staticmethod
+  def cacheable(query: str) -> bool:
+    return not SQL_NONDETERMINISTIC.search(query)
+
+  def check_version(self, data_version: int) -> None:
+    """Invalidate when the database changed since the last check"""
+    if self._data_version is not None and data_version != self._data_version:
+      self.invalidate()
+    self._data_version = data_version
+
+  def invalidate(self) -> None:
+    self.generation += 1
+    if self._entries:
+      self.invalidations += 1
+    self._entries.clear()
+    self.bytes = 0
+
+  def get(self, key: tuple):
+    entry = self._entries.get(key)
+    if entry is None:
+      self.misses += 1
+      return None
+    self._entries.move_to_end(key)
+    self.hits += 1
+    return entry[0]
+
+  def put(self, key: tuple, result: dict, size: int, generation: int) -> None:
+    """Store a result read while the cache was at `generation`, evicting least recently used entries"""
+    if generation != self.generation or size > self.max_bytes // 4:
+      return
+    previous = self._entries.pop(key, None)
+    if previous is not None:
+      self.bytes -= previous[1]
+    self._entries[key] = (result, size)
+    self.bytes += size
+    while self.bytes > self.max_bytes:
+      _, (_, evicted) = self._entries.popitem(last=False)
+      self.bytes -= evicted
+      self.evictions += 1
+
+  def stats(self) -> dict:
+    lookups = self.hits + self.misses
+    return {
+      'entries': len(self._entries),
+      'bytes': self.bytes,
+      'max_bytes': self.max_bytes,
+      'hits': self.hits,
+      'misses': self.misses,
+      'evictions': self.evictions,
+      'invalidations': self.invalidations,
+      'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0,
+    }
+
+
+class SchemaCatalog:
+  """Precomputed description of every table: columns, foreign keys, indexes and row counts.
+
+  The catalog is built when the server starts and rebuilt only when
+  `PRAGMA schema_version` changes, so agents get the whole schema from one
+  call and schema tools do not query sqlite_master on every request. Row
+  counts are only taken for the full schema views, and refreshed when
+  `PRAGMA data_version` shows that the data changed.
+  """
+
+  def __init__(self):
+    self._lock = asyncio.Lock()
+    self._catalog = None
+    self._schema_version = None
+    self._data_version = None
+    self.builds = 0
+    self.recounts = 0
+
+  @staticmethod
+  def _quote(name: str) -> str:
+    return '"' + name.replace('"', '""') + '"'
+
+  @staticmethod
+  def _build(conn) -> dict:
+    cursor = conn.cursor()
+    try:
+      version = cursor.execute("SELECT sqlite_version()").fetchone()[0]
+      tables = {}
+      for (name,) in cursor.execute("SELECT name FROM sqlite_master WHERE type='table' ORDER BY name").fetchall():
+        quoted = SchemaCatalog._quote(name)
+        columns = [{'name': row[1], 'type': row[2], 'not_null': bool(row[3]), 'default': row[4], 'primary_key': row[5]}
+                   for row in cursor.execute(f"PRAGMA table_info({quoted})").fetchall()]
+        foreign_keys = [{'column': row[3], 'table': row[2], 'references': row[4]}
+                        for row in cursor.execute(f"PRAGMA foreign_key_list({quoted})").fetchall()]
+        indexes = []
+        for row in cursor.execute(f"PRAGMA index_list({quoted})").fetchall():
+          index_columns = [info[2] for info in cursor.execute(f"PRAGMA index_info({SchemaCatalog._quote(row[1])})")]
+          indexes.append({'name': row[1], 'columns': index_columns, 'unique': bool(row[2]), 'origin': row[3]})
+        tables[name] = {'columns': columns, 'foreign_keys': foreign_keys, 'indexes': indexes, 'row_count': None}
+      views = [row[0] for row in cursor.execute("SELECT name FROM sqlite_master WHERE type='view' ORDER BY name")]
+      return {'sqlite_version': version, 'tables': tables, 'views': views}
+    finally:
+      cursor.close()
+
+  @staticmethod
+  def _count_rows(conn, tables: list) -> dict:
+    cursor = conn.cursor()
+    try:
+      return {name: cursor.execute(f"SELECT COUNT(*) FROM {SchemaCatalog._quote(name)}").fetchone()[0]
+              for name in tables}
+    finally:
+      cursor.close()
+
+  async def get(self, pool: SQLitePool, row_counts: bool = False) -> dict:
+    """Return the catalog, rebuilding it after schema changes
+
+    Counting rows scans every table, so it only happens for callers that ask
+    for `row_counts`, and again only after the data changed.
+    """
+    async with self._lock:
+      schema_version, data_version = pool.schema_version(), pool.data_version()
+      if self._catalog is None or schema_version != self._schema_version:
+        self._catalog = await pool.read(self._build)
+        self._schema_version = schema_version
+        self._data_version = None
+        self.builds += 1
+      if row_counts and data_version != self._data_version:
+        counts = await pool.read(self._count_rows, list(self._catalog['tables']))
+        for name, count in counts.items():
+          self._catalog['tables'][name]['row_count'] = count
+        self._data_version = data_version
+        self.recounts += 1
+      return self._catalog
+
+  @staticmethod
+  def render(catalog: dict) -> str:
+    """Compact text rendering: one line per column, with key and reference markers"""
+    lines = []
+    for name, table in catalog['tables'].items():
+      lines.append(f"Table {name} ({table['row_count']} rows)")
+      references = {fk['column']: f"{fk['table']}.{fk['references'] or '?'}" for fk in table['foreign_keys']}
+      for column in table['columns']:
+        line = f"  {column['name']} {column['type'] or 'ANY'}"
+        if column['primary_key']:
+          line += " PRIMARY KEY"
+        if column['not_null']:
+          line += " NOT NULL"
+        if column['name'] in references:
+          line += f" -> {references[column['name']]}"
+        lines.append(line)
+      for index in table['indexes']:
+        unique = "UNIQUE " if index['unique'] else ""
+        lines.append(f"  {unique}INDEX {index['name']} ({', '.join(index['columns'])})")
+    if catalog['views']:
+      lines.append(f"Views: {', '.join(catalog['views'])}")
+    return "\n".join(lines)
+
+  def stats(self) -> dict:
+    return {'schema_version': self._schema_version, 'builds': self.builds, 'row_recounts': self.recounts}
+
+
+class SlowQueryLog:
+  """Aggregates slow query_sql executions by query shape.
+
+  A shape is the query with literals replaced by `?`, so the same pattern
+  with different values is counted once. The log keeps the shapes with the
+  most total time and remembers which ones were already indexed, so a
+  recurring pattern is only ever indexed once.
+  """
+
+  def __init__(self, threshold_ms: float, max_shapes: int):
+    self.threshold_ms = threshold_ms
+    self.max_shapes = max_shapes
+    self._shapes = {}
+
+  @staticmethod
+  def shape(query: str) -> str:
+    shape = SQL_LITERAL.sub('?', ResultCache.key(query)[0])
+    return re.sub(r"\(\s*\?(?:\s*,\s*\?)*\s*\)", "(?)", shape)
+
+  def record(self, query: str, elapsed_ms: float) -> None:
+    if elapsed_ms < self.threshold_ms:
+      return
+    shape = self.shape(query)
+    entry = self._shapes.get(shape)
+    if entry is None:
+      if len(self._shapes) >= self.max_shapes:
+        # Forget the shape that cost the least so far
+        del self._shapes[min(self._shapes, key=lambda k: self._shapes[k]['total_ms'])]
+      entry = self._shapes[shape] = {'shape': shape, 'count': 0, 'total_ms': 0.0, 'max_ms': 0.0,
+                                     'example': query, 'indexed': None}
+    entry['count'] += 1
+    entry['total_ms'] += elapsed_ms
+    entry['max_ms'] = max(entry['max_ms'], elapsed_ms)
+
+  def mark_indexed(self, shape: str, indexes: list) -> None:
+    if shape in self._shapes:
+      self._shapes[shape]['indexed'] = indexes
+
+  def entries(self) -> list:
+    return sorted(self._shapes.values(), key=lambda e: e['total_ms'], reverse=True)
+
+  def stats(self) -> dict:
+    return {
+      'shapes': len(self._shapes),
+      'executions': sum(e['count'] for e in self._shapes.values()),
+      'indexed_shapes': sum(1 for e in self._shapes.values() if e['indexed'] is not None),
+    }
+
+
+def query_tables(query: str, catalog: dict) -> dict:
+  """Map every name a query uses for a table (the table itself or its alias) to the table"""
+  tables = {name.lower(): name for name in catalog['tables']}
+  names = {}
+  for match in SQL_TABLE_REF.finditer(query):
+    for item in match.group(1).split(','):
+      words = item.replace('"', '').split()
+      if not words or words[0].lower() not in tables:
+        continue
+      table = tables[words[0].lower()]
+      names[table.lower()] = table
+      alias = words[-1] if len(words) > 1 else None
+      if alias and alias.upper() != 'AS':
+        names[alias.lower()] = table
+  return names
+
+def candidate_indexes(query: str, table: str, names: dict, catalog: dict, covering: bool) -> list:
+  """Guess useful column lists for an index on one table from the query text
+
+  Two shapes are proposed: the table's literal filters (equality columns
+  first, then one range column, made covering when the query reads few
+  columns of the table), and its join columns plus equality filters, for
+  when the table is the inner side of a join. A qualified reference belongs
+  to a table through its name or alias, an unqualified one when no other
+  table in the query has a column of that name.
+  """
+  tables = set(names.values())
+
+  def resolve(qualifier, column):
+    if column is None:
+      return None
+    if qualifier:
+      owner = names.get(qualifier.lower())
+      owners = [owner] if owner else []
+    else:
+      owners = [t for t in tables]
+    owners = [t for t in owners if any(c['name'].lower() == column.lower() for c in catalog['tables'][t]['columns'])]
+    if len(owners) != 1:
+      return None
+    return owners[0], next(c['name'] for c in catalog['tables'][owners[0]]['columns'] if c['name'].lower() == column.lower())
+
+  joins, equality, ranges = [], [], []
+  for match in SQL_COMPARISON.finditer(query):
+    left = resolve(match.group(1), match.group(2))
+    if left is None:
+      continue
+    right = resolve(match.group(4), match.group(5))
+    if right is not None and right[0] != left[0]:
+      joins.extend(column for owner, column in (left, right) if owner == table and column not in joins)
+    elif left[0] == table:
+      target = equality if match.group(3).upper() in ('=', '==', 'IN', 'IS') else ranges
+      if left[1] not in target:
+        target.append(left[1])
+  ranges = [c for c in ranges if c not in equality]
+
+  candidates = []
+  filters = equality + ranges[:1]
+  if filters:
+    referenced = []
+    for match in SQL_COLUMN_REF.finditer(query):
+      column = resolve(match.group(1), match.group(2))
+      if column and column[0] == table and column[1] not in referenced:
+        referenced.append(column[1])
+    if covering and len(referenced) <= INDEX_MAX_COLUMNS:
+      # Covering: every column the query reads from this table is in the index
+      filters += [c for c in referenced if c not in filters]
+    candidates.append(filters)
+  if joins:
+    candidates.append(joins + [c for c in equality if c not in joins])
+  return candidates
+
+def plan_issues(plan: list, names: dict) -> list:
+  """Flag full table scans, automatic indexes and temporary B-trees in an EXPLAIN QUERY PLAN"""
+  issues = []
+  for row in plan:
+    detail = row[3]
+    scan = re.match(r"SCAN (\w+)(.*)$", detail)
+    automatic = re.match(r"SEARCH (\w+) USING AUTOMATIC (?:PARTIAL )?(?:COVERING )?INDEX \((.*)\)", detail)
+    if scan and 'INDEX' not in scan.group(2) and scan.group(1).lower() in names:
+      issues.append({'kind': 'scan', 'table': names[scan.group(1).lower()], 'detail': detail})
+    elif automatic and automatic.group(1).lower() in names:
+      columns = re.findall(r"(\w+)\s*(?:=|>|<|IS)", automatic.group(2))
+      issues.append({'kind': 'automatic_index', 'table': names[automatic.group(1).lower()],
+                     'columns': columns, 'detail': detail})
+    elif detail.startswith('USE TEMP B-TREE'):
+      issues.append({'kind': 'temp_btree', 'detail': detail})
+  return issues
+
+def schema_sandbox(conn) -> sqlite3.Connection:
+  """An empty in-memory copy of the schema (and planner statistics) to try hypothetical indexes on"""
+  sandbox = sqlite3.connect(':memory:')
+  for (sql,) in conn.execute("SELECT sql FROM sqlite_master WHERE sql IS NOT NULL AND name NOT LIKE 'sqlite_%'"):
+    sandbox.execute(sql)
+  if conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'sqlite_stat1'").fetchone():
+    sandbox.execute("ANALYZE")
+    sandbox.execute("DELETE FROM sqlite_stat1")
+    sandbox.executemany("INSERT INTO sqlite_stat1 VALUES (?, ?, ?)", conn.execute("SELECT * FROM sqlite_stat1"))
+    sandbox.execute("ANALYZE sqlite_schema")  # reload the copied statistics
+  return sandbox
+
+def advise_indexes(conn, query: str, catalog: dict) -> dict:
+  """Explain a query, flag scans and temp B-trees, and suggest indexes that change the plan
+
+  Each suggestion is tried as a hypothetical index on an empty copy of the
+  schema and only kept when the planner actually uses it.
+  """
+  plan = conn.execute(f"EXPLAIN QUERY PLAN {query}").fetchall()
+  names = query_tables(query, catalog)
+  issues = plan_issues(plan, names)
+  existing = {tuple(index['columns']) for table in catalog['tables'].values() for index in table['indexes']}
+  select_all = re.search(r"SELECT\s+(?:DISTINCT\s+)?(?:\w+\.)?\*", query, re.IGNORECASE) is not None
+
+  proposals = []
+  for issue in issues:
+    if issue['kind'] == 'automatic_index':
+      proposals.append((issue['table'], issue['columns']))
+  if any(issue['kind'] == 'scan' for issue in issues):
+    # The best fix for a scan is often an index on a filtered join partner that lets the
+    # planner start from it, so every table in the query gets a candidate
+    scanned = [issue['table'] for issue in issues if issue['kind'] == 'scan']
+    for table in dict.fromkeys(scanned + list(names.values())):
+      proposals.extend((table, columns) for columns in candidate_indexes(query, table, names, catalog, not select_all))
+  proposals = [(table, columns) for i, (table, columns) in enumerate(proposals)
+               if columns and tuple(columns) not in existing and (table, columns) not in proposals[:i]]
+
+  suggestions = []
+  if proposals:
+    sandbox = schema_sandbox(conn)
+    try:
+      for table, columns in proposals:
+        name = f"idx_{table}_{'_'.join(columns)}".lower()[:60]
+        sql = (f"CREATE INDEX IF NOT EXISTS {SchemaCatalog._quote(name)} ON {SchemaCatalog._quote(table)} "
+               f"({', '.join(SchemaCatalog._quote(c) for c in columns)})")
+        sandbox.execute(sql)
+        after = [row[3] for row in sandbox.execute(f"EXPLAIN QUERY PLAN {query}")]
+        sandbox.execute(f"DROP INDEX {SchemaCatalog._quote(name)}")
+        if any(name in detail.lower() for detail in after):
+          suggestions.append({'table': table, 'columns': columns, 'name': name, 'sql': sql, 'plan_after': after})
+    finally:
+      sandbox.close()
+  return {'plan': plan, 'issues': issues, 'suggestions': suggestions}
+
+def format_plan(plan: list) -> str:
+  """Render EXPLAIN QUERY PLAN rows as an indented tree"""
+  depth = {0: -1}
+  lines = []
+  for node, parent, _, detail in plan:
+    depth[node] = depth.get(parent, -1) + 1
+    lines.append(f"{'  ' * depth[node]}{detail}")
+  return "\n".join(lines)
+
+async def create_indexes_for(pool: SQLitePool, suggestions: list) -> list:
+  """Create suggested indexes through the writer queue, returning the names created"""
+  def create(conn, sql):
+    conn.execute(sql)
+  created = []
+  for suggestion in suggestions:
+    await pool.write(create, suggestion['sql'])
+    created.append(suggestion['name'])
+  return created
+
+
+def encode_cursor(query: str, offset: int) -> str:
+  """Opaque continuation token: the row offset, bound to a hash of the query"""
+  token = json.dumps({'q': hashlib.sha256(query.encode()).hexdigest()[:16], 'o': offset})
+  return base64.urlsafe_b64encode(token.encode()).decode().rstrip('=')
+
+def decode_cursor(cursor: str, query: str) -> int:
+  """Return the row offset stored in a continuation token
+
+  Raises:
+      ValueError: If the token is malformed or was issued for a different query
+  """
+  try:
+    token = json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+    offset = int(token['o'])
+  except (ValueError, KeyError, TypeError):
+    raise ValueError("Invalid cursor. Start again without a cursor.")
+  if token.get('q') != hashlib.sha256(query.encode()).hexdigest()[:16] or offset < 0:
+    raise ValueError("This cursor belongs to a different query. Pass the same query it was returned for.")
+  return offset
+
+def truncate_value(value):
+  """Shorten long text and blob values so one cell cannot blow the response budget"""
+  if isinstance(value, (bytes, memoryview)):
+    return f"<blob, {len(value)} bytes>"
+  if isinstance(value, str) and len(value) > QUERY_MAX_VALUE_CHARS:
+    return f"{value[:QUERY_MAX_VALUE_CHARS]}... [{len(value) - QUERY_MAX_VALUE_CHARS} more characters]"
+  return value
 
 # Create an MCP server with the lifespan
 nl2sql_mcp = FastMCP("nl2sql", lifespan=app_lifespan)
 
 
 @nl2sql_mcp.tool()
-async def query_sql(ctx: Context, query: str = None) -> str:
+async def query_sql(ctx: Context, query: str = None, page_size: int = QUERY_PAGE_SIZE, cursor: str = None,
+                    timeout_seconds: float = QUERY_TIMEOUT, output_format: str = "rows") -> str | ToolResult:
   """
   Tool to query the SQLite database with a custom query.
+  Large result sets are returned one page at a time.
   Args:
                   query: The SQL query to execute. If not provided, will run a default query.
+                  page_size: Maximum number of rows to return (default 100, maximum 1000). A page
+                    also ends early once the response reaches its size budget.
+                  cursor: Continuation token from a previous page. Pass it back together with
+                    the same query to get the next page.
+                  timeout_seconds: Stop the query if it runs longer than this (default 10, maximum 120).
+                  output_format: "rows" (default) for one dict per row, "columns" for column-oriented
+                    JSON, "csv", or "arrow" for an Arrow IPC stream returned as a blob resource.
+                    The compact formats are much smaller for wide results.
   Returns:
-                  The query results as a string.
+                  The query results, followed by a continuation cursor when more rows are available.
   """
   try:
-    conn = ctx.request_context.lifespan_context["conn"]
-    if conn is None:
+    pool = ctx.request_context.lifespan_context["pool"]
+    if pool is None:
       return "Database connection is not available. Check server logs for details."
+    if output_format not in QUERY_OUTPUT_FORMATS:
+      return f"Invalid output_format: {output_format}. Use one of: {', '.join(QUERY_OUTPUT_FORMATS)}."
+    if output_format == "arrow" and pa is None:
+      return "Query error: output_format \"arrow\" needs the pyarrow package. Use \"columns\" or \"csv\" instead."
     if not query:
       query = "SELECT name FROM sqlite_master WHERE type='table';"
-    logger.debug(f"Executing query: {query}")
+    page_size = max(1, min(page_size, QUERY_MAX_PAGE_SIZE))
+    timeout_seconds = max(0.1, min(timeout_seconds, QUERY_MAX_TIMEOUT))
+    try:
+      offset = decode_cursor(cursor, query) if cursor else 0
+    except ValueError as e:
+      return f"Query error: {e}"
+    cache = ctx.request_context.lifespan_context["cache"]
+    cache.check_version(pool.data_version())
+    cache_key = ResultCache.key(query, offset, page_size) if ResultCache.cacheable(query) else None
+    result = cache.get(cache_key) if cache_key else None
+    if result is not None:
+      logger.debug(f"Serving cached result for query: {query}")
+      return format_query_result(query, offset, result, output_format)
+    generation = cache.generation
+    logger.debug(f"Executing query: {query} (offset {offset}, page size {page_size})")
 
-    def run_query():
+    def run_query(conn):
       cursor = conn.cursor()
-      try:
-        cursor.execute(query)
-        if cursor.description:
-          columns = [column[0] for column in cursor.description]
-          results = []
-          for row in cursor.fetchall():
-            results.append(dict(zip(columns, row)))
-          return {"success": True, "results": results, "rowCount": len(results)}
-        else:
-          return {"success": True, "rowCount": cursor.rowcount, "message": f"Query affected {cursor.rowcount} rows"}
-      except Exception as e:
-        return {"success": False, "error": str(e)}
-      finally:
-        cursor.close()
-    loop = asyncio.get_event_loop()
-    result = await loop.run_in_executor(None, run_query)
-    if result["success"]:
-      if "results" in result:
-        return f"Query results: {result['results']}"
-      else:
-        return result["message"]
-    else:
-      return f"Query error: {result['error']}"
+      started = time.perf_counter()
+      with pool.deadline(conn, timeout_seconds, QUERY_MAX_STEPS) as limit:
+        try:
+          cursor.execute(query)
+          if cursor.description:
+            columns = [column[0] for column in cursor.description]
+            # Rows are kept as tuples, a page is only shaped when it is rendered. Sizes are
+            # still measured as the dicts of the "rows" format, so pages end at the same row
+            # whatever the format and the cached page serves every format.
+            key_size = sum(len(repr(column)) + 2 for column in columns)
+            # Skip the rows earlier pages already returned without keeping them
+            skipped = 0
+            while skipped < offset:
+              chunk = cursor.fetchmany(min(QUERY_FETCH_CHUNK, offset - skipped))
+              if not chunk:
+                break
+              skipped += len(chunk)
+            results = []
+            size = 0
+            more = False
+            while len(results) < page_size:
+              rows = cursor.fetchmany(min(QUERY_FETCH_CHUNK, page_size - len(results)))
+              if not rows:
+                break
+              for row in rows:
+                row = tuple(truncate_value(value) for value in row)
+                size += len(repr(row)) + key_size
+                if results and size > QUERY_MAX_RESPONSE_BYTES:
+                  more = True
+                  break
+                results.append(row)
+              if more:
+                break
+            if not more and len(results) == page_size:
+              more = cursor.fetchone() is not None
+            return {"success": True, "columns": columns, "rows": results, "rowCount": len(results), "more": more,
+                    "bytes": size, "ms": (time.perf_counter() - started) * 1000}
+          else:
+            return {"success": True, "rowCount": cursor.rowcount, "message": f"Query affected {cursor.rowcount} rows"}
+        except sqlite3.OperationalError as e:
+          if limit['expired']:
+            # Recorded in the slow query log like any other slow execution
+            return {"success": False, "ms": (time.perf_counter() - started) * 1000,
+                    "error": (f"Query stopped after running for more than {timeout_seconds:g} seconds. "
+                              f"Add filters or a LIMIT, check the joins with explain_query, or raise timeout_seconds.")}
+          if "readonly" in str(e):
+            return {"success": False, "error": f"{e}. Use execute_nonquery to modify the database."}
+          return {"success": False, "error": str(e)}
+        except Exception as e:
+          return {"success": False, "error": str(e)}
+        finally:
+          cursor.close()
+    result = await pool.read(run_query)
+    if "ms" in result:
+      ctx.request_context.lifespan_context["slow_log"].record(query, result["ms"])
+    if cache_key and result["success"] and "rows" in result:
+      # A commit while the query ran bumps the generation and the result is not stored
+      cache.check_version(pool.data_version())
+      cache.put(cache_key, result, result["bytes"], generation)
+    return format_query_result(query, offset, result, output_format)
   except Exception as e:
     logger.error(f"Query execution error: {type(e).__name__}: {str(e)}")
     return f"Error: {str(e)}"
 
 
+def format_query_result(query: str, offset: int, result: dict, output_format: str = "rows") -> str | ToolResult:
+  """Render a query_sql result, with a continuation cursor when more rows are available"""
+  if not result["success"]:
+    return f"Query error: {result['error']}"
+  if "rows" not in result:
+    return result["message"]
+  first, last = offset + 1, offset + result["rowCount"]
+  next_cursor = encode_cursor(query, last) if result["more"] else None
+  more = (f"More rows available. Call query_sql again with the same query "
+          f"and cursor=\"{next_cursor}\" for the next page.") if next_cursor else ""
+  if output_format == "columns":
+    return columns_result(result, offset, next_cursor)
+  if output_format == "csv":
+    return csv_result(result, more)
+  if output_format == "arrow":
+    return arrow_result(query, result, offset, more)
+  results = [dict(zip(result["columns"], row)) for row in result["rows"]]
+  if not result["more"] and offset == 0:
+    return f"Query results: {results}"
+  response = f"Query results (rows {first}-{last}): {results}"
+  if more:
+    response += f"\n{more}"
+  return response
+
+
+def columns_result(result: dict, offset: int, next_cursor: str = None) -> ToolResult:
+  """Column-oriented JSON: each column name once, then one list of values per column"""
+  data = {
+    'columns': result["columns"],
+    'values': [list(values) for values in zip(*result["rows"])] or [[] for _ in result["columns"]],
+    'offset': offset,
+    'rowCount': result["rowCount"],
+    'more': result["more"],
+  }
+  if next_cursor:
+    data['cursor'] = next_cursor  # pass back with the same query for the next page
+  return ToolResult(content=json.dumps(data, separators=(',', ':')), structured_content=data)
+
+
+def csv_result(result: dict, more: str) -> ToolResult:
+  """CSV with a header row, the continuation note goes in a separate content block"""
+  buffer = io.StringIO()
+  writer = csv.writer(buffer, lineterminator="\n")
+  writer.writerow(result["columns"])
+  writer.writerows(result["rows"])
+  content = [TextContent(type="text", text=buffer.getvalue())]
+  if more:
+    content.append(TextContent(type="text", text=more))
+  return ToolResult(content=content)
+
+
+def arrow_column(values: tuple):
+  """Arrow array for one result column, as text when SQLite returned mixed types"""
+  try:
+    return pa.array(values)
+  except (pa.ArrowInvalid, pa.ArrowTypeError):
+    return pa.array([None if value is None else str(value) for value in values], type=pa.string())
+
+
+def arrow_result(query: str, result: dict, offset: int, more: str) -> ToolResult:
+  """Arrow IPC stream as an embedded blob resource, with a short text summary"""
+  columns = result["columns"]
+  if result["rows"]:
+    arrays = [arrow_column(values) for values in zip(*result["rows"])]
+  else:
+    arrays = [pa.array([], type=pa.null()) for _ in columns]
+  # from_arrays keeps duplicate column names, unlike a dict of columns
+  table = pa.Table.from_arrays(arrays, names=columns)
+  sink = pa.BufferOutputStream()
+  with pa.ipc.new_stream(sink, table.schema) as writer:
+    writer.write_table(table)
+  stream = sink.getvalue().to_pybytes()
+  uri = f"query://results/{hashlib.sha256(query.encode()).hexdigest()[:16]}?offset={offset}"
+  rows = f"rows {offset + 1}-{offset + result['rowCount']}" if result['rowCount'] else "no rows"
+  summary = (f"Query results ({rows}) as an Arrow IPC stream "
+             f"({len(stream)} bytes, {ARROW_STREAM_MIME_TYPE}): {table.schema.to_string(show_schema_metadata=False)}")
+  content = [TextContent(type="text", text=summary.replace("\n", ", ")),
+             EmbeddedResource(type="resource", resource=BlobResourceContents(
+               uri=uri, mimeType=ARROW_STREAM_MIME_TYPE, blob=base64.b64encode(stream).decode()))]
+  if more:
+    content.append(TextContent(type="text", text=more))
+  return ToolResult(content=content)
+
+
 @nl2sql_mcp.tool()
 async def list_tables(ctx: Context) -> str:
   """List all tables in the SQLite database that can be queried."""
   try:
-    conn = ctx.request_context.lifespan_context["conn"]
-    if conn is None:
+    pool = ctx.request_context.lifespan_context["pool"]
+    if pool is None:
       return "Database connection is not available."
-
-    def get_tables():
-      cursor = conn.cursor()
-      cursor.execute(
-          "SELECT name FROM sqlite_master WHERE type='table';")
-      tables = [row[0] for row in cursor.fetchall()]
-      cursor.close()
-      return tables
-    loop = asyncio.get_event_loop()
-    tables = await loop.run_in_executor(None, get_tables)
-    return f"Available tables: {tables}"
+    catalog = await ctx.request_context.lifespan_context["catalog"].get(pool)
+    return f"Available tables: {list(catalog['tables'])}"
   except Exception as e:
     return f"Error listing tables: {str(e)}"
 
@@ -114,28 +758,21 @@ async def list_tables(ctx: Context) -> str:
 async def describe_table(ctx: Context, table_name: str) -> str:
   """
   Get the structure of a specific table in SQLite.
+  Prefer schema_catalog to get every table in one call.
   Args:
                   table_name: Name of the table to describe
   Returns:
                   Column information for the specified table
   """
   try:
-    conn = ctx.request_context.lifespan_context["conn"]
-    if conn is None:
+    pool = ctx.request_context.lifespan_context["pool"]
+    if pool is None:
       return "Database connection is not available."
-
-    def get_structure():
-      cursor = conn.cursor()
-      cursor.execute(f"PRAGMA table_info('{table_name}')")
-      columns = []
-      for row in cursor.fetchall():
-        col_name, data_type = row[1], row[2]
-        columns.append(f"{col_name} ({data_type})")
-      cursor.close()
-      return columns
-    loop = asyncio.get_event_loop()
-    structure = await loop.run_in_executor(None, get_structure)
-    if structure:
+    catalog = await ctx.request_context.lifespan_context["catalog"].get(pool)
+    # SQLite table names are case-insensitive
+    table = next((t for name, t in catalog['tables'].items() if name.lower() == table_name.lower()), None)
+    if table and table['columns']:
+      structure = [f"{column['name']} ({column['type']})" for column in table['columns']]
       return f"Structure of table '{table_name}':\n" + "\n".join(structure)
     else:
       return f"Table '{table_name}' not found or has no columns."
@@ -143,6 +780,35 @@ async def describe_table(ctx: Context, table_name: str) -> str:
     return f"Error describing table: {str(e)}"
 
 
+@nl2sql_mcp.tool()
+async def schema_catalog(ctx: Context) -> str:
+  """
+  Get the complete database schema in one call: every table with its columns, types,
+  primary and foreign keys, indexes and row count. Call this once before writing SQL
+  instead of describing tables one by one.
+  Returns:
+                  The schema, one line per column, with foreign keys shown as "-> Table.Column".
+  """
+  try:
+    pool = ctx.request_context.lifespan_context["pool"]
+    if pool is None:
+      return "Database connection is not available."
+    catalog = await ctx.request_context.lifespan_context["catalog"].get(pool, row_counts=True)
+    return f"Database schema:\n{SchemaCatalog.render(catalog)}"
+  except Exception as e:
+    return f"Error building schema catalog: {str(e)}"
+
+
+@nl2sql_mcp.resource("schema://catalog", mime_type="application/json")
+async def schema_catalog_resource(ctx: Context) -> str:
+  """The complete database schema (tables, columns, foreign keys, indexes, row counts) as JSON"""
+  pool = ctx.request_context.lifespan_context["pool"]
+  if pool is None:
+    raise RuntimeError("Database connection is not available.")
+  catalog = await ctx.request_context.lifespan_context["catalog"].get(pool, row_counts=True)
+  return json.dumps(catalog)
+
+
 @nl2sql_mcp.tool()
 async def execute_nonquery(ctx: Context, sql: str) -> str:
   """
@@ -153,23 +819,26 @@ async def execute_nonquery(ctx: Context, sql: str) -> str:
                   Result of the operation
   """
   try:
-    conn = ctx.request_context.lifespan_context["conn"]
-    if conn is None:
+    pool = ctx.request_context.lifespan_context["pool"]
+    if pool is None:
       return "Database connection is not available."
 
-    def run_nonquery():
+    if TRANSACTION_CONTROL.match(sql):
+      return "Operation failed: transactions are managed by the server, submit the statements without BEGIN/COMMIT."
+
+    def run_nonquery(conn):
+      # Runs inside the writer's batch transaction, an exception rolls back only this statement
+      cursor = conn.cursor()
       try:
-        cursor = conn.cursor()
         cursor.execute(sql)
-        row_count = cursor.rowcount
-        conn.commit()
+        return cursor.rowcount
+      finally:
         cursor.close()
-        return {"success": True, "rowCount": row_count}
-      except Exception as e:
-        conn.rollback()
-        return {"success": False, "error": str(e)}
-    loop = asyncio.get_event_loop()
-    result = await loop.run_in_executor(None, run_nonquery)
+    try:
+      result = {"success": True, "rowCount": await pool.write(run_nonquery)}
+    except sqlite3.Error as e:
+      result = {"success": False, "error": str(e)}
+    ctx.request_context.lifespan_context["cache"].invalidate()
     if result["success"]:
       return f"Operation successful. Rows affected: {result['rowCount']}"
     else:
@@ -178,29 +847,223 @@ async def execute_nonquery(ctx: Context, sql: str) -> str:
     return f"Error executing SQL: {str(e)}"
 
 
+def bulk_insert_rows(table: dict, columns: list, rows: list = None, data: dict = None):
+  """Check bulk_insert input against a catalog table and return (column names, rows)
+
+  Raises:
+      ValueError: describing the first problem found, before anything is written
+  """
+  if rows is None and data is None:
+    raise ValueError("pass rows (with columns) or data")
+  if rows is not None and data is not None:
+    raise ValueError("pass either rows or data, not both")
+  if data is not None:
+    if columns is None:
+      columns = list(data)
+    elif set(columns) != set(data):
+      raise ValueError("columns must name exactly the keys of data")
+    lengths = {len(data[name]) for name in columns}
+    if len(lengths) > 1:
+      raise ValueError(f"every column in data needs the same number of values, got lengths {sorted(lengths)}")
+    rows = list(zip(*(data[name] for name in columns)))
+  elif not columns:
+    raise ValueError("columns is required with rows")
+  if not rows:
+    raise ValueError("no rows to insert")
+  if len(rows) > BULK_INSERT_MAX_ROWS:
+    raise ValueError(f"{len(rows)} rows is more than the {BULK_INSERT_MAX_ROWS} allowed in one call")
+
+  # SQLite column names are case-insensitive, the schema's spelling is used in the statement
+  known = {column['name'].lower(): column for column in table['columns']}
+  unknown = [name for name in columns if name.lower() not in known]
+  if unknown:
+    raise ValueError(f"unknown columns {unknown}, the table has {[c['name'] for c in table['columns']]}")
+  if len({name.lower() for name in columns}) != len(columns):
+    raise ValueError("a column is listed more than once")
+  names = [known[name.lower()]['name'] for name in columns]
+  primary_key = [column for column in table['columns'] if column['primary_key']]
+  rowid_alias = len(primary_key) == 1 and (primary_key[0]['type'] or '').upper() == 'INTEGER'
+  missing = [column['name'] for column in table['columns']
+             if column['not_null'] and column['default'] is None and column['name'] not in names
+             and not (rowid_alias and column['primary_key'])]
+  if missing:
+    raise ValueError(f"required columns {missing} have no value and no default")
+
+  for number, row in enumerate(rows):
+    if not isinstance(row, (list, tuple)) or len(row) != len(names):
+      raise ValueError(f"row {number} does not have {len(names)} values")
+  return names, rows
+
+
+@nl2sql_mcp.tool()
+async def bulk_insert(ctx: Context, table: str, columns: list[str] = None, rows: list[list] = None,
+                      data: dict[str, list] = None) -> str:
+  """
+  Insert many rows into a table in one call, much faster than one execute_nonquery per row.
+  Pass either row arrays (columns plus rows) or column-oriented data.
+  Args:
+                  table: The table to insert into
+                  columns: Column names, in the order of the values in each row
+                  rows: Rows as arrays of values, e.g. [[1, "Rock"], [2, "Jazz"]]
+                  data: Values per column instead of rows, e.g. {"GenreId": [1, 2], "Name": ["Rock", "Jazz"]}
+  Returns:
+                  Number of rows inserted, transactions used and rows per second
+  """
+  try:
+    pool = ctx.request_context.lifespan_context["pool"]
+    if pool is None:
+      return "Database connection is not available."
+    catalog = await ctx.request_context.lifespan_context["catalog"].get(pool)
+    name, schema = next(((name, t) for name, t in catalog['tables'].items() if name.lower() == table.lower()),
+                        (None, None))
+    if schema is None:
+      return f"Bulk insert failed: table '{table}' not found."
+    try:
+      names, rows = bulk_insert_rows(schema, columns, rows, data)
+    except ValueError as e:
+      return f"Bulk insert failed: {e}"
+
+    statement = (f"INSERT INTO {SchemaCatalog._quote(name)} ({', '.join(SchemaCatalog._quote(c) for c in names)}) "
+                 f"VALUES ({', '.join('?' * len(names))})")
+
+    def insert_chunk(conn, chunk):
+      # Runs in its own savepoint of the writer's transaction, a failing row undoes only this chunk
+      cursor = conn.cursor()
+      try:
+        cursor.executemany(statement, chunk)
+        return cursor.rowcount
+      finally:
+        cursor.close()
+    started = time.perf_counter()
+    inserted = chunks = 0
+    try:
+      # One write per chunk, so each chunk is committed before the next is queued
+      # and other writes are not held up behind the whole load
+      for offset in range(0, len(rows), BULK_INSERT_CHUNK_ROWS):
+        inserted += await pool.write(insert_chunk, rows[offset:offset + BULK_INSERT_CHUNK_ROWS])
+        chunks += 1
+    except sqlite3.Error as e:
+      first = chunks * BULK_INSERT_CHUNK_ROWS
+      last = min(first + BULK_INSERT_CHUNK_ROWS, len(rows)) - 1
+      return (f"Bulk insert failed in rows {first}-{last}: {e}. "
+              f"{inserted} rows before them were inserted and committed.")
+    finally:
+      if chunks:
+        ctx.request_context.lifespan_context["cache"].invalidate()
+    elapsed = time.perf_counter() - started
+    return (f"Inserted {inserted} rows into {name} in {chunks} transactions, "
+            f"{elapsed:.3f}s ({inserted / elapsed if elapsed else 0:.0f} rows/s)")
+  except Exception as e:
+    return f"Error in bulk insert: {str(e)}"
+
+
+@nl2sql_mcp.tool()
+async def explain_query(ctx: Context, query: str, create_indexes: bool = False) -> str:
+  """
+  Show how SQLite will execute a query without running it, flag full table scans and
+  temporary B-trees, and suggest indexes that would avoid them. Use this to check a
+  query that is slow or joins large tables.
+  Args:
+                  query: The SQL query to analyse
+                  create_indexes: Also create the suggested indexes (default False)
+  Returns:
+                  The query plan, the issues found and the suggested CREATE INDEX statements.
+  """
+  try:
+    pool = ctx.request_context.lifespan_context["pool"]
+    if pool is None:
+      return "Database connection is not available."
+    catalog = await ctx.request_context.lifespan_context["catalog"].get(pool)
+    advice = await pool.read(advise_indexes, query, catalog)
+    return await format_advice(pool, advice, create_indexes)
+  except sqlite3.Error as e:
+    return f"Query error: {str(e)}"
+  except Exception as e:
+    return f"Error explaining query: {str(e)}"
+
+
+async def format_advice(pool: SQLitePool, advice: dict, create: bool) -> str:
+  """Render advise_indexes() output, creating the suggested indexes when asked to"""
+  lines = [f"Query plan:\n{format_plan(advice['plan'])}"]
+  if not advice['issues']:
+    lines.append("No full scans or temporary B-trees, the query is well indexed.")
+    return "\n".join(lines)
+  lines.append("Issues:")
+  for issue in advice['issues']:
+    if issue['kind'] == 'scan':
+      lines.append(f"- Full scan of {issue['table']}: {issue['detail']}")
+    elif issue['kind'] == 'automatic_index':
+      lines.append(f"- SQLite builds a temporary index on {issue['table']} for every execution: {issue['detail']}")
+    else:
+      lines.append(f"- Temporary B-tree (sort): {issue['detail']}")
+  if not advice['suggestions']:
+    lines.append("No index found that the planner would use for these issues.")
+    return "\n".join(lines)
+  lines.append("Suggested indexes:")
+  lines.extend(f"- {suggestion['sql']}" for suggestion in advice['suggestions'])
+  if create:
+    created = await create_indexes_for(pool, advice['suggestions'])
+    lines.append(f"Created indexes: {', '.join(created)}")
+  return "\n".join(lines)
+
+
+@nl2sql_mcp.tool()
+async def slow_queries(ctx: Context, create_indexes: bool = False) -> str:
+  """
+  List the slowest query shapes seen by query_sql (the same query with different values
+  counts as one shape) and suggest indexes for the ones that keep recurring.
+  Args:
+                  create_indexes: Create the suggested indexes for recurring shapes that were not
+                    indexed before (default False)
+  Returns:
+                  The slow query shapes with their counts and timings, and the index suggestions.
+  """
+  try:
+    pool = ctx.request_context.lifespan_context["pool"]
+    if pool is None:
+      return "Database connection is not available."
+    slow_log = ctx.request_context.lifespan_context["slow_log"]
+    entries = slow_log.entries()
+    if not entries:
+      return f"No query_sql execution took longer than {SLOW_QUERY_MS} ms so far."
+    catalog = await ctx.request_context.lifespan_context["catalog"].get(pool)
+    sections = []
+    for entry in entries:
+      header = (f"{entry['shape']}\n  {entry['count']} executions, avg {entry['total_ms'] / entry['count']:.1f} ms, "
+                f"max {entry['max_ms']:.1f} ms")
+      if entry['indexed'] is not None:
+        sections.append(f"{header}\n  Already indexed: {', '.join(entry['indexed']) or 'no useful index'}")
+        continue
+      if entry['count'] < SLOW_QUERY_MIN_COUNT:
+        sections.append(header)
+        continue
+      advice = await pool.read(advise_indexes, entry['example'], catalog)
+      for suggestion in advice['suggestions']:
+        header += f"\n  Suggested: {suggestion['sql']}"
+      if create_indexes:
+        created = await create_indexes_for(pool, advice['suggestions'])
+        slow_log.mark_indexed(entry['shape'], created)
+        header += f"\n  Created: {', '.join(created) or 'nothing, no index would help'}"
+      sections.append(header)
+    return f"Slow query shapes (slower than {SLOW_QUERY_MS} ms, by total time):\n" + "\n".join(sections)
+  except Exception as e:
+    return f"Error listing slow queries: {str(e)}"
+
+
 @nl2sql_mcp.tool()
 async def database_info(ctx: Context) -> str:
   """Get general information about the connected SQLite database"""
   try:
-    conn = ctx.request_context.lifespan_context["conn"]
-    if conn is None:
+    pool = ctx.request_context.lifespan_context["pool"]
+    if pool is None:
       return "Database connection is not available."
 
-    def get_info():
-      cursor = conn.cursor()
-      cursor.execute("SELECT sqlite_version()")
-      version = cursor.fetchone()[0]
-      cursor.execute(
-          "SELECT COUNT(*) FROM sqlite_master WHERE type='table';")
-      table_count = cursor.fetchone()[0]
-      cursor.close()
-      return {
-          "version": version,
-          "database": SQLITE_DB_PATH,
-          "table_count": table_count
-      }
-    loop = asyncio.get_event_loop()
-    info = await loop.run_in_executor(None, get_info)
+    catalog = await ctx.request_context.lifespan_context["catalog"].get(pool)
+    info = {
+        "version": catalog['sqlite_version'],
+        "database": SQLITE_DB_PATH,
+        "table_count": len(catalog['tables'])
+    }
     return (
         f"Database Information:\n"
         f"Database File: {info['database']}\n"
@@ -210,9 +1073,27 @@ async def database_info(ctx: Context) -> str:
   except Exception as e:
     return f"Error getting database info: {str(e)}"
 
+@nl2sql_mcp.tool()
+async def database_stats(ctx: Context) -> str:
+  """Report connection pool and query result cache statistics (checkouts, waits, hit rate, ...)"""
+  pool = ctx.request_context.lifespan_context["pool"]
+  if pool is None:
+    return "Database connection is not available."
+  stats = {
+    'pool': pool.stats(),
+    'result_cache': ctx.request_context.lifespan_context["cache"].stats(),
+    'schema_catalog': ctx.request_context.lifespan_context["catalog"].stats(),
+    'slow_queries': ctx.request_context.lifespan_context["slow_log"].stats(),
+  }
+  return f"Database statistics:\n{json.dumps(stats, indent=2)}"
+
 if __name__ == "__main__":
   parser = argparse.ArgumentParser(description="nl2sql server")
   parser.add_argument("--transport", "-t", choices=["stdio", "sse", "http"], default="stdio",
                       help="MCP transport to use (stdio or sse or http)")
+  parser.add_argument("--in-memory", action="store_true",
+                      help="Serve queries from an in-memory copy of the database, checkpointed to the file")
   args = parser.parse_args()
+  if args.in_memory:
+    SQLITE_IN_MEMORY = True
   nl2sql_mcp.run(transport=args.transport)
@@ -0,0 +1,77 @@
+import asyncio
+import threading
+from concurrent.futures import Future
+
+
+class SingleFlight:
+  """Coalesce concurrent identical upstream calls into a single execution.
+
+  The first caller for a key runs the function, every caller that arrives
+  while it is still in flight waits for and shares the same result (or
+  exception). Nothing is cached once the call completes, so this only
+  removes duplicate work from bursts, it never serves stale data.
+
+  `do` is for blocking functions called from worker threads, `do_async` for
+  coroutine functions called on an event loop.
+  """
+
+  def __init__(self, name: str):
+    self.name = name
+    self._lock = threading.Lock()
+    self._futures = {}  # key -> concurrent.futures.Future (threads)
+    self._tasks = {}    # key -> asyncio.Task (event loop)
+    self.calls = 0
+    self.executions = 0
+    self.deduplicated = 0
+
+  def _join(self, inflight: dict, key, create):
+    """Return (inflight call, is_leader), registering a new one when none is pending"""
+    with self._lock:
+      self.calls += 1
+      existing = inflight.get(key)
+      if existing is not None:
+        self.deduplicated += 1
+        return existing, False
+      self.executions += 1
+      inflight[key] = create()
+      return inflight[key], True
+
+  def do(self, key, fn, *args, **kwargs):
+    """Call fn(*args, **kwargs), or wait for an identical call already running in another thread"""
+    future, leader = self._join(self._futures, key, Future)
+    if not leader:
+      return future.result()
+    try:
+      result = fn(*args, **kwargs)
+      future.set_result(result)
+      return result
+    except BaseException as e:
+      future.set_exception(e)
+      raise
+    finally:
+      with self._lock:
+        self._futures.pop(key, None)
+
+  async def do_async(self, key, fn, *args, **kwargs):
+    """Await fn(*args, **kwargs), or an identical call already in flight on this event loop"""
+    def create():
+      task = asyncio.ensure_future(fn(*args, **kwargs))
+      task.add_done_callback(lambda _: self._forget(key, task))
+      return task
+    task, _ = self._join(self._tasks, key, create)
+    # Shield the shared task so one caller cancelling does not cancel the others
+    return await asyncio.shield(task)
+
+  def _forget(self, key, task) -> None:
+    with self._lock:
+      if self._tasks.get(key) is task:
+        del self._tasks[key]
+
+  def stats(self) -> dict:
+    with self._lock:
+      return {
+        'calls': self.calls,
+        'upstream_executions': self.executions,
+        'deduplicated': self.deduplicated,
+        'in_flight': len(self._futures) + len(self._tasks),
+      }
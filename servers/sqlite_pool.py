@@ -0,0 +1,378 @@
+import asyncio
+import contextlib
+import functools
+import pathlib
+import sqlite3
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+
+class SQLitePool:
+  """A fixed pool of read-only SQLite connections plus one batching writer.
+
+  Readers are opened with `mode=ro` URIs, so a read can never modify the
+  database, and each call checks one connection out for its whole duration,
+  so two queries never share a connection. Work runs on a dedicated thread
+  pool sized to the connections; sqlite3 releases the GIL while a statement
+  runs, so read throughput scales with the number of readers.
+
+  The database runs in WAL mode so readers never wait for the writer. All
+  writes go through a bounded queue drained by a single writer task, which
+  applies every write waiting in the queue in one transaction (each in its
+  own savepoint, so one failing write does not undo the others) and pays
+  for one commit per batch instead of one per write. A full queue makes
+  callers wait, which is the backpressure on write bursts.
+
+  With `in_memory` the file is copied once into a shared in-memory database
+  (SQLite's memdb VFS) that every connection uses, so reads never touch the
+  file, and committed writes are copied back to it with the backup API
+  every `checkpoint_interval` seconds and on close. The in-memory database
+  has no WAL: a commit waits for running reads to finish, so `timeout`
+  should be longer than the longest read allowed. Only the writer can
+  change it, so data_version() and schema_version() come from counters
+  the writer task keeps instead of a monitor connection, which would block
+  behind a waiting commit. Changes other processes make to the file are
+  not seen, and writes since the last checkpoint are lost if the process
+  dies.
+  """
+
+  PROGRESS_STEPS = 1000  # VM instructions between deadline checks
+
+  def __init__(self, path: str, readers: int, timeout: float = 5.0, pragmas: dict = None,
+               write_queue: int = 1000, write_batch: int = 200, in_memory: bool = False,
+               checkpoint_interval: float = 60.0):
+    self.path = path
+    self.size = readers
+    self.timeout = timeout
+    self.pragmas = pragmas or {}
+    self.write_queue = write_queue
+    self.write_batch = write_batch
+    self.in_memory = in_memory
+    self.checkpoint_interval = checkpoint_interval
+    # Unique per pool, memdb databases with a name starting with "/" are shared by the whole process
+    self._memory_uri = f"file:/sqlite-pool-{id(self)}?vfs=memdb"
+    self._executor = ThreadPoolExecutor(max_workers=readers + 1, thread_name_prefix="sqlite")
+    self._readers = None
+    self._writer = None
+    self._writes = None
+    self._writer_task = None
+    self._monitor = None
+    self._disk = None
+    self._snapshot_source = None
+    self._checkpoint_task = None
+    self._closing = None
+    self._saved_version = None
+    self._generation = 0
+    self._schema = None
+    self._all = []
+    self.checkouts = 0
+    self.waits = 0
+    self.total_wait_ms = 0.0
+    self.writes = 0
+    self.failed_writes = 0
+    self.batches = 0
+    self.max_batch = 0
+    self.write_waits = 0
+    self.timeouts = 0
+    self.cancelled = 0
+    self.checkpoints = 0
+    self.checkpoint_errors = 0
+    self.last_checkpoint_ms = 0.0
+
+  def _connect(self, read_only: bool) -> sqlite3.Connection:
+    if read_only:
+      if self.in_memory:
+        uri = f"{self._memory_uri}&mode=ro"
+      else:
+        uri = f"{pathlib.Path(self.path).resolve().as_uri()}?mode=ro"
+      # Autocommit too: sqlite3's implicit BEGIN before a DML statement would leave a
+      # reader in a transaction, pinned to an old snapshot, when the write then fails
+      conn = sqlite3.connect(uri, uri=True, timeout=self.timeout, check_same_thread=False, isolation_level=None)
+    elif self.in_memory:
+      # memdb keeps its journal in memory, WAL needs a real file
+      conn = sqlite3.connect(self._memory_uri, uri=True, timeout=self.timeout, check_same_thread=False,
+                             isolation_level=None)
+    else:
+      # Autocommit mode, the writer task issues BEGIN/COMMIT itself
+      conn = sqlite3.connect(self.path, timeout=self.timeout, check_same_thread=False, isolation_level=None)
+      conn.execute("PRAGMA journal_mode=WAL")
+      conn.execute("PRAGMA synchronous=NORMAL")  # durable at every checkpoint, safe in WAL mode
+    for name, value in self.pragmas.items():
+      conn.execute(f"PRAGMA {name}={value}")
+    self._all.append(conn)
+    return conn
+
+  def _connect_disk(self) -> sqlite3.Connection:
+    """Open the file that an in-memory pool loads from and checkpoints to"""
+    conn = sqlite3.connect(self.path, timeout=self.timeout, check_same_thread=False, isolation_level=None)
+    conn.execute("PRAGMA journal_mode=WAL")
+    self._all.append(conn)
+    return conn
+
+  def _load_snapshot(self) -> None:
+    # VACUUM INTO rather than the backup API: a backup copies the file header
+    # as is, and memdb cannot open a database whose header says WAL mode
+    self._disk.execute("VACUUM INTO ?", (self._memory_uri,))
+
+  async def open(self) -> None:
+    """Open the writer (switching the database to WAL mode), every reader, and start the writer task
+
+    An in-memory pool first copies the file into memory and also starts
+    the checkpoint task.
+    """
+    if not pathlib.Path(self.path).is_file():
+      # sqlite3 would silently create an empty database for the writer
+      raise FileNotFoundError(f"SQLite database not found: {self.path}")
+    loop = asyncio.get_running_loop()
+    self._readers = asyncio.Queue()
+    self._writes = asyncio.Queue(maxsize=self.write_queue)
+    # In memory, the writer connection is the first one, so it is what keeps the database alive
+    self._writer = await loop.run_in_executor(self._executor, self._connect, False)
+    if self.in_memory:
+      self._disk = await loop.run_in_executor(self._executor, self._connect_disk)
+      await loop.run_in_executor(self._executor, self._load_snapshot)
+    if self.in_memory:
+      self._snapshot_source = await loop.run_in_executor(self._executor, self._connect, True)
+      self._schema = await loop.run_in_executor(self._executor, self._writer_schema_version)
+    else:
+      self._monitor = await loop.run_in_executor(self._executor, self._connect, True)
+    for _ in range(self.size):
+      self._readers.put_nowait(await loop.run_in_executor(self._executor, self._connect, True))
+    self._writer_task = asyncio.create_task(self._write_loop())
+    if self.in_memory:
+      self._saved_version = self.data_version()
+      self._closing = asyncio.Event()
+      self._checkpoint_task = asyncio.create_task(self._checkpoint_loop())
+
+  async def close(self) -> None:
+    if self._checkpoint_task is not None:
+      # Not cancelled, so a checkpoint in progress finishes before the final one
+      self._closing.set()
+      await self._checkpoint_task
+    if self._writer_task is not None:
+      # Let queued writes finish before the connections go away
+      await self._writes.put(None)
+      await self._writer_task
+    if self.in_memory and self._disk is not None:
+      await self.checkpoint()
+    loop = asyncio.get_running_loop()
+    for conn in self._all:
+      await loop.run_in_executor(self._executor, conn.close)
+    self._all.clear()
+    self._executor.shutdown(wait=False)
+
+  def data_version(self) -> int:
+    """PRAGMA data_version of a dedicated monitor connection
+
+    The value changes whenever any other connection, in this process or
+    not, commits to the database. Only call this from the event loop thread.
+    In memory, the number of batches the writer committed: the pragma would
+    wait for the lock while a commit waits for running reads.
+    """
+    if self.in_memory:
+      return self._generation
+    return self._monitor.execute("PRAGMA data_version").fetchone()[0]
+
+  def schema_version(self) -> int:
+    """PRAGMA schema_version, incremented by SQLite on every schema change
+
+    In memory, the value the writer read after its last commit.
+    """
+    if self.in_memory:
+      return self._schema
+    return self._monitor.execute("PRAGMA schema_version").fetchone()[0]
+
+  def _writer_schema_version(self) -> int:
+    return self._writer.execute("PRAGMA schema_version").fetchone()[0]
+
+  @contextlib.contextmanager
+  def deadline(self, conn: sqlite3.Connection, seconds: float, max_steps: int = 0):
+    """Abort statements on conn once they run longer than `seconds` or `max_steps` VM instructions
+
+    Yields a dict whose 'expired' flag tells an "interrupted" OperationalError
+    raised by the deadline apart from other errors.
+    """
+    state = {'expired': False, 'steps': 0}
+    expires_at = time.monotonic() + seconds
+
+    def check():
+      state['steps'] += self.PROGRESS_STEPS
+      if time.monotonic() > expires_at or (max_steps and state['steps'] > max_steps):
+        state['expired'] = True
+        return 1  # non-zero makes SQLite abort the running statement
+      return 0
+    conn.set_progress_handler(check, self.PROGRESS_STEPS)
+    try:
+      yield state
+    finally:
+      conn.set_progress_handler(None, 0)
+      if state['expired']:
+        self.timeouts += 1
+
+  async def _run(self, conn: sqlite3.Connection, release, fn, *args, interruptible: bool = False, **kwargs):
+    """Run fn(conn, ...) on the pool, calling release() once the thread is done with conn
+
+    A cancelled caller stops waiting, and when `interruptible` the running
+    statement is interrupted, but the connection is only released when the
+    thread is really done with it.
+    """
+    loop = asyncio.get_running_loop()
+    future = self._executor.submit(functools.partial(fn, conn, *args, **kwargs))
+    try:
+      return await asyncio.wrap_future(future)
+    except asyncio.CancelledError:
+      if interruptible and not future.done():
+        conn.interrupt()
+        self.cancelled += 1
+      raise
+    finally:
+      if future.done():
+        release()
+      else:
+        future.add_done_callback(lambda _: loop.call_soon_threadsafe(release))
+
+  async def read(self, fn, *args, **kwargs):
+    """Check out a reader connection and run fn(conn, *args, **kwargs) on the pool
+
+    Cancelling the caller interrupts the statement running on the connection.
+    A transaction fn leaves open (an explicit BEGIN) is rolled back before
+    the connection goes back to the pool.
+    """
+    if self._readers.empty():
+      self.waits += 1
+    queued_at = time.perf_counter()
+    conn = await self._readers.get()
+    self.total_wait_ms += (time.perf_counter() - queued_at) * 1000
+    self.checkouts += 1
+    def job(conn):
+      try:
+        return fn(conn, *args, **kwargs)
+      finally:
+        if conn.in_transaction:
+          conn.rollback()
+    return await self._run(conn, lambda: self._readers.put_nowait(conn), job, interruptible=True)
+
+  async def write(self, fn, *args, **kwargs):
+    """Queue fn(conn, *args, **kwargs) for the writer task and wait for its result
+
+    fn runs inside a transaction managed by the writer, so it must not
+    commit or roll back itself; raising an exception undoes only its own
+    changes. Waits while the write queue is full.
+    """
+    future = asyncio.get_running_loop().create_future()
+    if self._writes.full():
+      self.write_waits += 1
+    await self._writes.put((lambda conn: fn(conn, *args, **kwargs), future))
+    return await future
+
+  async def _write_loop(self) -> None:
+    loop = asyncio.get_running_loop()
+    stopping = False
+    while not stopping:
+      job = await self._writes.get()
+      if job is None:
+        break
+      batch = [job]
+      # Everything that queued up while the previous batch ran goes into this one
+      while len(batch) < self.write_batch and not self._writes.empty():
+        job = self._writes.get_nowait()
+        if job is None:
+          stopping = True
+          break
+        batch.append(job)
+      outcomes, committed = await loop.run_in_executor(self._executor, self._apply_batch, [fn for fn, _ in batch])
+      if committed:
+        self._generation += 1
+      self.batches += 1
+      self.max_batch = max(self.max_batch, len(batch))
+      for (_, future), (ok, value) in zip(batch, outcomes):
+        self.writes += 1
+        if not ok:
+          self.failed_writes += 1
+        if not future.done():
+          future.set_result(value) if ok else future.set_exception(value)
+
+  def _apply_batch(self, fns: list) -> list:
+    """Run a batch of writes in one transaction, each in its own savepoint
+
+    Returns:
+        tuple: (ok, result or exception) per write, and whether the transaction committed
+    """
+    conn = self._writer
+    outcomes = []
+    try:
+      conn.execute("BEGIN IMMEDIATE")
+      for fn in fns:
+        conn.execute("SAVEPOINT write")
+        try:
+          outcomes.append((True, fn(conn)))
+          conn.execute("RELEASE write")
+        except Exception as e:
+          conn.execute("ROLLBACK TO write")
+          conn.execute("RELEASE write")
+          outcomes.append((False, e))
+      conn.execute("COMMIT")
+    except Exception as e:
+      if conn.in_transaction:
+        conn.execute("ROLLBACK")
+      return [(False, e)] * len(fns), False
+    if self.in_memory:
+      # Nothing else writes, so the shared lock this needs is free and it never waits
+      self._schema = self._writer_schema_version()
+    return outcomes, True
+
+  def _save_snapshot(self) -> None:
+    # A read-only connection of its own: it sees only committed data, does not touch
+    # the writer's transaction, and the event loop's monitor stays free meanwhile
+    self._snapshot_source.backup(self._disk)
+
+  async def checkpoint(self) -> bool:
+    """Copy an in-memory database back to its file if anything was committed since the last copy
+
+    Returns:
+        bool: True if the file was written
+    """
+    version = self.data_version()
+    if version == self._saved_version:
+      return False
+    started = time.perf_counter()
+    await asyncio.get_running_loop().run_in_executor(self._executor, self._save_snapshot)
+    self._saved_version = version
+    self.checkpoints += 1
+    self.last_checkpoint_ms = (time.perf_counter() - started) * 1000
+    return True
+
+  async def _checkpoint_loop(self) -> None:
+    while True:
+      try:
+        await asyncio.wait_for(self._closing.wait(), timeout=self.checkpoint_interval)
+        return  # close() takes the final checkpoint
+      except asyncio.TimeoutError:
+        pass
+      try:
+        await self.checkpoint()
+      except sqlite3.Error:
+        # Keep the changes in memory and try again next interval
+        self.checkpoint_errors += 1
+
+  def stats(self) -> dict:
+    return {
+      'readers': self.size,
+      'idle_readers': self._readers.qsize() if self._readers is not None else 0,
+      'checkouts': self.checkouts,
+      'waits': self.waits,
+      'avg_wait_ms': round(self.total_wait_ms / self.checkouts, 3) if self.checkouts else 0.0,
+      'writes': self.writes,
+      'failed_writes': self.failed_writes,
+      'write_batches': self.batches,
+      'avg_write_batch': round(self.writes / self.batches, 2) if self.batches else 0.0,
+      'max_write_batch': self.max_batch,
+      'queued_writes': self._writes.qsize() if self._writes is not None else 0,
+      'write_queue_waits': self.write_waits,
+      'timeouts': self.timeouts,
+      'cancelled': self.cancelled,
+      'in_memory': self.in_memory,
+      'checkpoints': self.checkpoints,
+      'checkpoint_errors': self.checkpoint_errors,
+      'last_checkpoint_ms': round(self.last_checkpoint_ms, 3),
+    }
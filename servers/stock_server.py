@@ -1,10 +1,31 @@
 import argparse
-from fastmcp import FastMCP
+import asyncio
+import csv
+import difflib
+import functools
+import httpx
+import io
+from fastmcp import Context, FastMCP
+from fastmcp.tools.tool import ToolResult
 import datetime
 import json
+import numpy as np
+import pandas as pd
+import tiktoken
 import yfinance as yf
 import math
 import logging
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from zoneinfo import ZoneInfo
+from singleflight import SingleFlight
+from dotenv import load_dotenv
+
+load_dotenv()
 
 # Set up logging
 logging.basicConfig(level=logging.DEBUG)
@@ -12,6 +33,614 @@ logger = logging.getLogger("stock")
 
 stock_mcp = FastMCP("stock")
 
+# Coalesces identical concurrent Yahoo Finance requests into one upstream call
+yahoo_singleflight = SingleFlight("yahoo")
+
+# Ticker symbols as Yahoo Finance spells them (BRK-B, ^GSPC, EURUSD=X, 7203.T), which
+# also keeps them safe to use as file names in the on-disk caches
+TICKER_SYMBOL_PATTERN = re.compile(r'[A-Z0-9^][A-Z0-9^=.\-]{0,14}')
+
+
+def ticker_symbol(stock_ticker: str) -> str:
+  """Normalize a ticker to upper case
+
+  Raises:
+      ValueError: With a user facing message when it is not a ticker symbol
+  """
+  symbol = stock_ticker.strip().upper()
+  if not TICKER_SYMBOL_PATTERN.fullmatch(symbol) or '..' in symbol:
+    raise ValueError(f"Invalid ticker symbol: {stock_ticker}. Please provide a valid stock ticker.")
+  return symbol
+
+# Ticker metadata (yf.Ticker.info) cache settings
+TICKER_INFO_TTL = 15 * 60          # seconds a valid ticker's metadata is reused
+TICKER_INFO_NEGATIVE_TTL = 5 * 60  # seconds an invalid symbol is remembered
+TICKER_INFO_MAX_ENTRIES = 512      # LRU bound on the number of cached tickers
+
+
+class TickerInfoCache:
+  """Process-wide TTL + LRU cache for yf.Ticker.info lookups.
+
+  Valid tickers are cached for `ttl` seconds, symbols that Yahoo does not
+  recognise are cached for `negative_ttl` seconds so repeated typos do not
+  go upstream, and the cache never holds more than `max_entries` tickers.
+  Failed lookups (network errors, rate limits) raise and are not cached.
+  """
+
+  def __init__(self, ttl: float, negative_ttl: float, max_entries: int):
+    self.ttl = ttl
+    self.negative_ttl = negative_ttl
+    self.max_entries = max_entries
+    self._entries = OrderedDict()  # symbol -> (expires_at, info)
+    self._lock = threading.Lock()
+    self.hits = 0
+    self.misses = 0
+    self.negative_hits = 0
+    self.evictions = 0
+
+  @staticmethod
+  def is_valid(info: dict) -> bool:
+    """A ticker is considered valid when Yahoo reports a market price for it"""
+    return bool(info) and info.get('regularMarketPrice') is not None
+
+  def get(self, stock_ticker: str) -> dict:
+    """Return the cached info dict for a ticker, fetching it on a miss.
+
+    Returns an empty dict when Yahoo does not know the ticker.
+
+    Raises:
+        Exception: whatever the upstream lookup raised, nothing is cached
+    """
+    key = stock_ticker.strip().upper()
+    now = time.monotonic()
+    with self._lock:
+      entry = self._entries.get(key)
+      if entry is not None and entry[0] > now:
+        self._entries.move_to_end(key)
+        self.hits += 1
+        if not self.is_valid(entry[1]):
+          self.negative_hits += 1
+        return entry[1]
+      self.misses += 1
+
+    # Fetch outside the lock so a slow lookup does not block other tickers,
+    # concurrent misses for the same ticker share a single request
+    info = yahoo_singleflight.do(('info', key), self._fetch, key)
+
+    ttl = self.ttl if self.is_valid(info) else self.negative_ttl
+    with self._lock:
+      self._entries[key] = (time.monotonic() + ttl, info)
+      self._entries.move_to_end(key)
+      while len(self._entries) > self.max_entries:
+        self._entries.popitem(last=False)
+        self.evictions += 1
+    return info
+
+  @staticmethod
+  def _fetch(stock_ticker: str) -> dict:
+    # Exceptions propagate: only an answer Yahoo actually gave may be negative-cached
+    return yf.Ticker(stock_ticker).info or {}
+
+  def invalidate(self, stock_ticker: str = None) -> None:
+    """Drop one ticker, or every ticker when none is given"""
+    with self._lock:
+      if stock_ticker is None:
+        self._entries.clear()
+      else:
+        self._entries.pop(stock_ticker.strip().upper(), None)
+
+  def stats(self) -> dict:
+    with self._lock:
+      lookups = self.hits + self.misses
+      return {
+        'entries': len(self._entries),
+        'hits': self.hits,
+        'misses': self.misses,
+        'negative_hits': self.negative_hits,
+        'evictions': self.evictions,
+        'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0,
+      }
+
+
+ticker_info_cache = TickerInfoCache(
+  ttl=TICKER_INFO_TTL,
+  negative_ttl=TICKER_INFO_NEGATIVE_TTL,
+  max_entries=TICKER_INFO_MAX_ENTRIES,
+)
+
+# Offline symbol directory settings
+STOCK_SYMBOLS_FILE = os.getenv("STOCK_SYMBOLS_FILE", "data/symbols.csv")  # comma separated list of snapshots
+# Listings the first snapshot file is refreshed from, NASDAQ Trader's daily symbol directory
+# covers every NASDAQ, NYSE, NYSE American, NYSE Arca and Cboe listing. Empty to disable.
+STOCK_SYMBOLS_SOURCES = os.getenv("STOCK_SYMBOLS_SOURCES",
+                                  "https://www.nasdaqtrader.com/dynamic/SymDir/nasdaqlisted.txt,"
+                                  "https://www.nasdaqtrader.com/dynamic/SymDir/otherlisted.txt")
+SYMBOL_RELOAD_CHECK = 60  # seconds between checks of the snapshot files for changes
+SYMBOL_REFRESH_INTERVAL = 7 * 24 * 60 * 60  # snapshot age that triggers a background refresh
+SYMBOL_REFRESH_RETRY = 60 * 60              # seconds between attempts while refreshing fails
+NASDAQ_TRADER_EXCHANGES = {  # exchange codes used by NASDAQ Trader's otherlisted.txt
+  'A': 'NYSE American',
+  'N': 'NYSE',
+  'P': 'NYSE Arca',
+  'Z': 'Cboe BZX',
+  'V': 'IEX',
+}
+
+
+class SymbolDirectory:
+  """Offline directory of known ticker symbols for instant validation and lookup.
+
+  Symbols are held in a sorted NumPy array (with names and exchanges in
+  parallel arrays), so an exact check or a prefix scan is a binary search.
+  The directory is loaded in bulk from snapshot files, either CSV files with
+  symbol/name/exchange columns or NASDAQ Trader's pipe-delimited
+  nasdaqlisted.txt/otherlisted.txt, and reloaded when they change on disk.
+  When the first snapshot is missing or older than `refresh_interval`, it
+  is rebuilt from the `sources` URLs in a background thread. Symbols it
+  cannot judge (indices, currencies, foreign listings) are left to the
+  ticker metadata cache.
+  """
+
+  def __init__(self, paths: list, reload_check: float, sources: list = None,
+               refresh_interval: float = SYMBOL_REFRESH_INTERVAL, refresh_retry: float = SYMBOL_REFRESH_RETRY):
+    self.paths = paths
+    self.reload_check = reload_check
+    self.sources = sources or []
+    self.refresh_interval = refresh_interval
+    self.refresh_retry = refresh_retry
+    self._refresh_thread = None
+    self._refresh_attempted_at = None
+    self._refresh_lock = threading.Lock()  # one download and snapshot write at a time
+    self._lock = threading.Lock()
+    self._mtimes = None
+    self._checked_at = 0.0
+    self._symbols = np.array([], dtype=str)
+    self._names = np.array([], dtype=str)
+    self._exchanges = np.array([], dtype=str)
+
+  @staticmethod
+  def _read_rows(path: str):
+    """Yield (symbol, name, exchange) rows from a CSV or NASDAQ Trader snapshot"""
+    with open(path, newline='', encoding='utf-8') as f:
+      yield from SymbolDirectory._parse_rows(f)
+
+  @staticmethod
+  def _parse_rows(f):
+    nasdaq_trader = '|' in f.readline()
+    f.seek(0)
+    for row in csv.DictReader(f, delimiter='|' if nasdaq_trader else ','):
+      row = {k.strip().lower(): (v or '').strip() for k, v in row.items() if k}
+      symbol = row.get('symbol') or row.get('act symbol') or row.get('ticker')
+      if not symbol or symbol.startswith('File Creation Time') or row.get('test issue') == 'Y':
+        continue
+      name = row.get('name') or row.get('security name') or ''
+      exchange = row.get('exchange', '')
+      if nasdaq_trader:
+        # Yahoo Finance writes share classes as BRK-B, not BRK.B
+        symbol = symbol.replace('.', '-')
+        exchange = NASDAQ_TRADER_EXCHANGES.get(exchange, exchange) if exchange else 'NASDAQ'
+      yield symbol.upper(), name, exchange
+
+  def refresh(self) -> int:
+    """Download every source into the first snapshot file and reload, returning the number of symbols
+
+    Raises:
+        httpx.HTTPError: if a source cannot be downloaded, the old snapshot is kept
+        ValueError: if the sources list no symbols
+    """
+    with self._refresh_lock:
+      rows = {}
+      with httpx.Client(timeout=30, follow_redirects=True) as client:
+        for url in self.sources:
+          response = client.get(url)
+          response.raise_for_status()
+          for symbol, name, exchange in self._parse_rows(io.StringIO(response.text, newline='')):
+            rows.setdefault(symbol, (name, exchange))
+      if not rows:
+        raise ValueError(f"no symbols found in {', '.join(self.sources)}")
+      path = self.paths[0]
+      os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+      tmp = f"{path}.tmp"
+      with open(tmp, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f)
+        writer.writerow(['symbol', 'name', 'exchange'])
+        writer.writerows((symbol, name, exchange) for symbol, (name, exchange) in sorted(rows.items()))
+      os.replace(tmp, path)
+      logger.debug(f"Refreshed {len(rows)} symbols into {path}")
+      return self.load()
+
+  def _refresh_quietly(self) -> None:
+    try:
+      self.refresh()
+    except Exception as e:
+      logger.warning(f"Symbol directory refresh failed, retrying in {self.refresh_retry:.0f}s: {e}")
+
+  def _maybe_refresh(self, now: float) -> None:
+    """Start a background refresh when the first snapshot is missing or old"""
+    if not self.sources or not self.paths:
+      return
+    if self._refresh_attempted_at is not None and now - self._refresh_attempted_at < self.refresh_retry:
+      return
+    try:
+      if time.time() - os.path.getmtime(self.paths[0]) < self.refresh_interval:
+        return
+    except OSError:
+      pass  # missing, refresh it
+    with self._lock:
+      if self._refresh_thread is not None and self._refresh_thread.is_alive():
+        return
+      self._refresh_attempted_at = now
+      self._refresh_thread = threading.Thread(target=self._refresh_quietly, name="symbol-refresh", daemon=True)
+      self._refresh_thread.start()
+
+  def load(self) -> int:
+    """(Re)build the directory from the snapshot files, returning the number of symbols"""
+    rows = []
+    mtimes = {}
+    for path in self.paths:
+      try:
+        mtimes[path] = os.path.getmtime(path)
+        rows.extend(self._read_rows(path))
+      except OSError:
+        continue
+    symbols, index = np.unique(np.array([r[0] for r in rows], dtype=str), return_index=True)
+    with self._lock:
+      self._symbols = symbols
+      self._names = np.array([rows[i][1] for i in index], dtype=str)
+      self._exchanges = np.array([rows[i][2] for i in index], dtype=str)
+      self._mtimes = mtimes
+    if rows:
+      logger.debug(f"Loaded {len(symbols)} symbols from {', '.join(mtimes)}")
+    return len(symbols)
+
+  def _maybe_reload(self) -> None:
+    now = time.monotonic()
+    if now - self._checked_at < self.reload_check:
+      return
+    self._checked_at = now
+    self._maybe_refresh(now)
+    mtimes = {}
+    for path in self.paths:
+      try:
+        mtimes[path] = os.path.getmtime(path)
+      except OSError:
+        pass
+    if mtimes != self._mtimes:
+      self.load()
+
+  @property
+  def size(self) -> int:
+    self._maybe_reload()
+    return len(self._symbols)
+
+  def _index(self, symbol: str) -> int:
+    symbols = self._symbols
+    i = int(np.searchsorted(symbols, symbol))
+    return i if i < len(symbols) and symbols[i] == symbol else -1
+
+  def contains(self, stock_ticker: str):
+    """True/False when the directory can judge the symbol, None when it cannot
+
+    False only means the symbol is not listed: the directory covers US
+    exchange listings, not every symbol Yahoo Finance serves.
+    """
+    symbol = stock_ticker.strip().upper()
+    if not self.size or any(c in symbol for c in '^=.'):
+      return None
+    return self._index(symbol) >= 0
+
+  def _entries(self, indices) -> list:
+    return [{'symbol': str(self._symbols[i]), 'name': str(self._names[i]), 'exchange': str(self._exchanges[i])}
+            for i in indices]
+
+  def lookup(self, query: str, limit: int = 10) -> list:
+    """Find symbols by exact match, symbol prefix, company name substring, then fuzzy match"""
+    if not self.size:
+      return []
+    query = query.strip().upper()
+    found = []
+    exact = self._index(query)
+    if exact >= 0:
+      found.append(exact)
+    lo, hi = np.searchsorted(self._symbols, [query, query + chr(0x10FFFF)])
+    found.extend(i for i in range(lo, min(hi, lo + limit)) if i != exact)
+    if len(found) < limit:
+      name_hits = np.flatnonzero(np.char.find(np.char.upper(self._names), query) >= 0)
+      found.extend(i for i in name_hits[:limit] if i not in found)
+    if len(found) < limit:
+      found.extend(i for i in self._fuzzy(query, limit) if i not in found)
+    return self._entries(found[:limit])
+
+  def _fuzzy(self, query: str, limit: int) -> list:
+    # Only compare against symbols sharing the first letter to keep this fast
+    if not query:
+      return []
+    lo, hi = np.searchsorted(self._symbols, [query[0], query[0] + chr(0x10FFFF)])
+    candidates = self._symbols[lo:hi].tolist()
+    matches = difflib.get_close_matches(query, candidates, n=limit, cutoff=0.6)
+    return [lo + candidates.index(m) for m in matches]
+
+  def suggest(self, stock_ticker: str, limit: int = 3) -> list:
+    return [entry['symbol'] for entry in self.lookup(stock_ticker, limit)]
+
+  def symbols(self) -> np.ndarray:
+    self._maybe_reload()
+    return self._symbols
+
+
+symbol_directory = SymbolDirectory(
+  [path.strip() for path in STOCK_SYMBOLS_FILE.split(',') if path.strip()],
+  reload_check=SYMBOL_RELOAD_CHECK,
+  sources=[url.strip() for url in STOCK_SYMBOLS_SOURCES.split(',') if url.strip()],
+)
+
+
+def ticker_exists(stock_ticker: str) -> bool:
+  """Check a ticker offline when the symbol directory lists it, otherwise with the shared metadata cache
+
+  Raises:
+      Exception: whatever the upstream lookup raised
+  """
+  try:
+    ticker_symbol(stock_ticker)
+  except ValueError:
+    return False
+  if symbol_directory.contains(stock_ticker):
+    return True
+  return TickerInfoCache.is_valid(ticker_info_cache.get(stock_ticker))
+
+def validate_ticker(stock_ticker: str) -> str:
+  """Check a ticker, suggesting listed symbols for one Yahoo Finance does not know either
+
+  Returns:
+      str: A user facing error message for an invalid ticker, None if it is valid
+  """
+  try:
+    if ticker_exists(stock_ticker):
+      return None
+  except Exception as e:
+    logger.debug(f"Ticker info lookup failed for {stock_ticker}: {e}")
+    return f"Could not check ticker symbol {stock_ticker} with Yahoo Finance right now. Please try again."
+  message = f"Invalid ticker symbol: {stock_ticker}. Please provide a valid stock ticker."
+  suggestions = symbol_directory.suggest(stock_ticker)
+  if suggestions:
+    message += f" Did you mean: {', '.join(suggestions)}?"
+  return message
+
+# Compact output settings
+OUTPUT_FORMATS = ("text", "compact")
+PRICE_DECIMALS = 2   # prices, percentages and indicator values
+RATIO_DECIMALS = 3   # correlations and betas
+TOKEN_ENCODING = "cl100k_base"
+
+
+class OutputSavings:
+  """Counts how many bytes and tokens compact responses saved over the text format"""
+
+  def __init__(self, encoding: str):
+    self.encoding = encoding
+    self._encoder = None
+    self._lock = threading.Lock()
+    self.totals = {'responses': 0, 'text_bytes': 0, 'compact_bytes': 0, 'text_tokens': 0, 'compact_tokens': 0}
+
+  def count_tokens(self, text: str) -> int:
+    if self._encoder is None:
+      try:
+        self._encoder = tiktoken.get_encoding(self.encoding)
+      except Exception as e:
+        # The BPE file is downloaded on first use, fall back to ~4 bytes per token offline
+        logger.debug(f"Token encoding {self.encoding} unavailable: {e}")
+        self._encoder = False
+    if self._encoder:
+      return len(self._encoder.encode(text))
+    return math.ceil(len(text.encode()) / 4)
+
+  def measure(self, text: str, compact: str) -> dict:
+    savings = {
+      'text_bytes': len(text.encode()),
+      'compact_bytes': len(compact.encode()),
+      'text_tokens': self.count_tokens(text),
+      'compact_tokens': self.count_tokens(compact),
+    }
+    with self._lock:
+      self.totals['responses'] += 1
+      for key, value in savings.items():
+        self.totals[key] += value
+    return savings
+
+  def stats(self) -> dict:
+    with self._lock:
+      return dict(self.totals)
+
+
+output_savings = OutputSavings(TOKEN_ENCODING)
+
+
+def compact_values(values, decimals: int = PRICE_DECIMALS) -> list:
+  """Round a numeric column for compact output, NaN becomes null"""
+  rounded = np.round(np.asarray(values, dtype=float), decimals)
+  return [None if v != v else v for v in rounded.tolist()]
+
+
+def compact_output(data: dict, text: str) -> ToolResult:
+  """Build a compact tool result: MCP structured content plus the same data as minified JSON.
+
+  The savings over the equivalent text response are measured, added to the
+  payload and accumulated for stock_stats.
+  """
+  compact = json.dumps(data, separators=(',', ':'))
+  data = {**data, 'savings': output_savings.measure(text, compact)}
+  return ToolResult(content=json.dumps(data, separators=(',', ':')), structured_content=data)
+
+# Worker pool for the blocking yfinance tools
+STOCK_POOL_WORKERS = int(os.getenv("STOCK_POOL_WORKERS", "8"))
+STOCK_TOOL_CONCURRENCY = {      # max concurrent calls per tool, the rest wait in line
+  "stock_price": 4,
+  "stock_prices": 2,
+  "stock_info": 4,
+  "income_statement": 2,
+  "stock_indicators": 4,
+  "portfolio_analytics": 2,
+  "quote_poller": 4,
+  "stock_screen": 4,
+}
+DEFAULT_TOOL_CONCURRENCY = 2
+# Threads shared by every multi-ticker download (watchlists, portfolios, screener refresh)
+STOCK_DOWNLOAD_THREADS = int(os.getenv("STOCK_DOWNLOAD_THREADS", "16"))
+
+
+class StockWorkerPool:
+  """Dedicated, size-limited thread pool for blocking stock tools.
+
+  Each tool gets its own concurrency cap so a burst of one tool cannot take
+  every worker, and the event loop is never blocked by Yahoo Finance I/O.
+  Queue depth and wait time are tracked per tool.
+  """
+
+  def __init__(self, max_workers: int, limits: dict, default_limit: int):
+    self.max_workers = max_workers
+    self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="stock-worker")
+    self._limits = limits
+    self._default_limit = default_limit
+    self._semaphores = {}
+    self._metrics = {}
+
+  def _tool_metrics(self, tool: str) -> dict:
+    return self._metrics.setdefault(tool, {
+      'waiting': 0, 'running': 0, 'max_waiting': 0,
+      'completed': 0, 'failed': 0, 'total_wait_ms': 0.0,
+    })
+
+  async def run(self, tool: str, fn, *args, **kwargs):
+    """Run fn(*args, **kwargs) on the pool once the tool's concurrency slot is free"""
+    semaphore = self._semaphores.get(tool)
+    if semaphore is None:
+      semaphore = self._semaphores[tool] = asyncio.Semaphore(self._limits.get(tool, self._default_limit))
+    metrics = self._tool_metrics(tool)
+
+    metrics['waiting'] += 1
+    metrics['max_waiting'] = max(metrics['max_waiting'], metrics['waiting'])
+    queued_at = time.perf_counter()
+    try:
+      await semaphore.acquire()
+    finally:
+      metrics['waiting'] -= 1
+    metrics['total_wait_ms'] += (time.perf_counter() - queued_at) * 1000
+    metrics['running'] += 1
+    try:
+      loop = asyncio.get_running_loop()
+      result = await loop.run_in_executor(self._executor, functools.partial(fn, *args, **kwargs))
+      metrics['completed'] += 1
+      return result
+    except BaseException:
+      metrics['failed'] += 1
+      raise
+    finally:
+      metrics['running'] -= 1
+      semaphore.release()
+
+  def stats(self) -> dict:
+    running = sum(m['running'] for m in self._metrics.values())
+    tools = {}
+    for tool, m in self._metrics.items():
+      calls = m['completed'] + m['failed']
+      tools[tool] = {
+        'limit': self._limits.get(tool, self._default_limit),
+        'waiting': m['waiting'],
+        'running': m['running'],
+        'max_waiting': m['max_waiting'],
+        'completed': m['completed'],
+        'failed': m['failed'],
+        'avg_wait_ms': round(m['total_wait_ms'] / calls, 2) if calls else 0.0,
+      }
+    return {
+      'workers': self.max_workers,
+      'running': running,
+      'queued_in_pool': max(0, running - self.max_workers),
+      'tools': tools,
+    }
+
+
+stock_worker_pool = StockWorkerPool(STOCK_POOL_WORKERS, STOCK_TOOL_CONCURRENCY, DEFAULT_TOOL_CONCURRENCY)
+
+
+class DownloadPool:
+  """Process-wide bounded thread pool for fanning out Yahoo Finance downloads.
+
+  Multi-ticker tools run inside worker pool threads, so they cannot queue
+  their downloads back on that pool without risking a deadlock; they share
+  this one instead of each starting threads of their own. A `map` call can
+  be capped below the pool size so a long background refresh leaves room
+  for interactive batches.
+  """
+
+  def __init__(self, max_workers: int):
+    self.max_workers = max_workers
+    self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="stock-download")
+    self._lock = threading.Lock()
+    self.queued = 0
+    self.running = 0
+    self.max_queued = 0
+    self.completed = 0
+    self.failed = 0
+    self.total_wait_ms = 0.0
+
+  def _call(self, fn, item, queued_at: float):
+    with self._lock:
+      self.queued -= 1
+      self.running += 1
+      self.total_wait_ms += (time.perf_counter() - queued_at) * 1000
+    try:
+      result = fn(item)
+      with self._lock:
+        self.completed += 1
+      return result
+    except BaseException:
+      with self._lock:
+        self.failed += 1
+      raise
+    finally:
+      with self._lock:
+        self.running -= 1
+
+  def map(self, fn, items: list, parallel: int = None) -> list:
+    """Return [fn(item) for item in items], running at most `parallel` of them at once"""
+    slots = threading.Semaphore(min(parallel or self.max_workers, self.max_workers))
+    futures = []
+    for item in items:
+      slots.acquire()
+      with self._lock:
+        self.queued += 1
+        self.max_queued = max(self.max_queued, self.queued)
+      future = self._executor.submit(self._call, fn, item, time.perf_counter())
+      future.add_done_callback(lambda _: slots.release())
+      futures.append(future)
+    return [future.result() for future in futures]
+
+  def stats(self) -> dict:
+    with self._lock:
+      calls = self.completed + self.failed
+      return {
+        'workers': self.max_workers,
+        'queued': self.queued,
+        'running': self.running,
+        'max_queued': self.max_queued,
+        'completed': self.completed,
+        'failed': self.failed,
+        'avg_wait_ms': round(self.total_wait_ms / calls, 2) if calls else 0.0,
+      }
+
+
+download_pool = DownloadPool(STOCK_DOWNLOAD_THREADS)
+
+
+def run_in_stock_pool(fn):
+  """Decorator turning a blocking stock tool into an async tool run on the worker pool"""
+  @functools.wraps(fn)
+  async def wrapper(*args, **kwargs):
+    return await stock_worker_pool.run(fn.__name__, fn, *args, **kwargs)
+  return wrapper
+
 @stock_mcp.prompt()
 def stock_summary(stock_data: str) -> str:
   """Prompt template for summarising stock price"""
@@ -19,117 +648,623 @@ def stock_summary(stock_data: str) -> str:
                 Using the information below, summarise the pertintent points relevant to stock price movement
                 Data {stock_data}"""
 
+# Financial statement cache settings
+STOCK_STATEMENT_DIR = os.getenv("STOCK_STATEMENT_DIR", "data/stock_statements")
+STATEMENT_RECHECK_INTERVAL = 24 * 60 * 60  # seconds between checks while a report is overdue
+STATEMENT_SCHEDULE = {  # module -> (fiscal period length, typical filing lag) in days
+  'incomeStatementHistory': (365, 90),          # annual reports land within ~90 days
+  'incomeStatementHistoryQuarterly': (91, 45),  # quarterly reports land within ~45 days
+}
+INCOME_STATEMENT_ROWS = {
+  'totalRevenue': 'Total Revenue',
+  'costOfRevenue': 'Cost Of Revenue',
+  'grossProfit': 'Gross Profit',
+  'operatingIncome': 'Operating Income',
+  'netIncome': 'Net Income'
+}
+
+
+def fetch_income_statements(stock_ticker: str, module: str) -> list:
+  """Download annual or quarterly income statements in Yahoo Finance API format"""
+  ticker = yf.Ticker(stock_ticker)
+  frame = ticker.quarterly_income_stmt if module == 'incomeStatementHistoryQuarterly' else ticker.income_stmt
+  statements = []
+  if frame is None or frame.empty:
+    return statements
+  for col in frame.columns:
+    statement = {'endDate': {'raw': int(col.timestamp())}}
+    for key, row in INCOME_STATEMENT_ROWS.items():
+      statement[key] = {'raw': float(frame.loc[row, col]) if row in frame.index else None}
+    statements.append(statement)
+  return statements
+
+
+class StatementCache:
+  """Persistent financial statement cache whose expiry follows the fiscal calendar.
+
+  Statements only change when a company files, so instead of a fixed TTL an
+  entry is kept until the next report is expected: latest period end + one
+  fiscal period + the usual filing lag. Once a report is due the entry is
+  re-checked at most every `recheck_interval` seconds until it shows up.
+  Entries are kept in memory and as one JSON file per ticker and module.
+  """
+
+  def __init__(self, root: str, recheck_interval: float):
+    self.root = root
+    self.recheck_interval = recheck_interval
+    self._entries = {}
+    self._lock = threading.Lock()
+    self.hits = 0
+    self.misses = 0
+    self.stale_served = 0
+
+  def _path(self, stock_ticker: str, module: str) -> str:
+    return os.path.join(self.root, f"{ticker_symbol(stock_ticker)}_{module}.json")
+
+  def refresh_after(self, module: str, statements: list, now: float) -> float:
+    """Epoch time after which the next report for this module is expected"""
+    if not statements:
+      return now + self.recheck_interval
+    latest = max(statement['endDate']['raw'] for statement in statements)
+    period_days, lag_days = STATEMENT_SCHEDULE[module]
+    return max(latest + (period_days + lag_days) * 86400, now + self.recheck_interval)
+
+  def _read(self, path: str) -> dict:
+    try:
+      with open(path) as f:
+        return json.load(f)
+    except (OSError, ValueError):
+      return None
+
+  def _write(self, path: str, entry: dict) -> None:
+    os.makedirs(self.root, exist_ok=True)
+    tmp = f"{path}.tmp"
+    with open(tmp, 'w') as f:
+      json.dump(entry, f)
+    os.replace(tmp, path)
+
+  def get(self, stock_ticker: str, module: str) -> list:
+    """Return the statements for a ticker, going upstream only when a new report is due"""
+    stock_ticker = stock_ticker.strip().upper()
+    key = (stock_ticker, module)
+    path = self._path(stock_ticker, module)
+    now = time.time()
+
+    with self._lock:
+      entry = self._entries.get(key)
+    if entry is None:
+      entry = self._read(path)
+      if entry is not None:
+        with self._lock:
+          self._entries[key] = entry
+    if entry is not None and entry['refresh_after'] > now:
+      with self._lock:
+        self.hits += 1
+      return entry['statements']
+
+    with self._lock:
+      self.misses += 1
+    try:
+      statements = yahoo_singleflight.do(('statements', stock_ticker, module),
+                                         fetch_income_statements, stock_ticker, module)
+      if not statements and entry is not None and entry['statements']:
+        # yfinance returns an empty frame when a download fails, filed statements do not disappear
+        raise ValueError("no statements returned")
+    except Exception as e:
+      if entry is None:
+        raise
+      logger.warning(f"Serving cached {module} for {stock_ticker} after refresh failed: {e}")
+      with self._lock:
+        self.stale_served += 1
+      return entry['statements']
+
+    entry = {
+      'statements': statements,
+      'fetched_at': now,
+      'refresh_after': self.refresh_after(module, statements, now)
+    }
+    with self._lock:
+      self._entries[key] = entry
+    self._write(path, entry)
+    return statements
+
+  def stats(self) -> dict:
+    with self._lock:
+      lookups = self.hits + self.misses
+      return {
+        'entries': len(self._entries),
+        'hits': self.hits,
+        'misses': self.misses,
+        'stale_served': self.stale_served,
+        'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0,
+      }
+
+
+statement_cache = StatementCache(STOCK_STATEMENT_DIR, recheck_interval=STATEMENT_RECHECK_INTERVAL)
+
 def fetch_yahoo_finance_data(stock_ticker: str, modules: str) -> dict:
   """Helper function to fetch data from Yahoo Finance API using yfinance
+
+  Income statements are served from the statement cache, which only goes
+  back to Yahoo Finance once the next report is expected.
   
   Args:
       stock_ticker: Alphanumeric stock ticker symbol
-      modules: Yahoo Finance API modules to request (used to determine what data to fetch)
+      modules: Comma separated Yahoo Finance API modules to request
+               ("incomeStatementHistory", "incomeStatementHistoryQuarterly")
       
   Returns:
       dict: The structured data mimicking Yahoo Finance API response format
   """
   try:
-    ticker = yf.Ticker(stock_ticker)
-    
-    # Map modules to yfinance data
+    requested = {module.strip() for module in modules.split(',')}
     result = {}
-    
-    if 'incomeStatementHistory' in modules or 'incomeStatementHistoryQuarterly' in modules:
-      # Get income statement data
-      result['incomeStatementHistory'] = {'incomeStatementHistory': []}
-      result['incomeStatementHistoryQuarterly'] = {'incomeStatementHistory': []}
-      
-      # Annual income statements
-      annual = ticker.income_stmt
-      if not annual.empty:
-        for col in annual.columns:
-          date_timestamp = int(col.timestamp())
-          statement = {
-            'endDate': {'raw': date_timestamp},
-            'totalRevenue': {'raw': annual.loc['Total Revenue', col] if 'Total Revenue' in annual.index else None},
-            'costOfRevenue': {'raw': annual.loc['Cost Of Revenue', col] if 'Cost Of Revenue' in annual.index else None},
-            'grossProfit': {'raw': annual.loc['Gross Profit', col] if 'Gross Profit' in annual.index else None},
-            'operatingIncome': {'raw': annual.loc['Operating Income', col] if 'Operating Income' in annual.index else None},
-            'netIncome': {'raw': annual.loc['Net Income', col] if 'Net Income' in annual.index else None}
-          }
-          result['incomeStatementHistory']['incomeStatementHistory'].append(statement)
-      
-      # Quarterly income statements
-      quarterly = ticker.quarterly_income_stmt
-      if not quarterly.empty:
-        for col in quarterly.columns:
-          date_timestamp = int(col.timestamp())
-          statement = {
-            'endDate': {'raw': date_timestamp},
-            'totalRevenue': {'raw': quarterly.loc['Total Revenue', col] if 'Total Revenue' in quarterly.index else None},
-            'costOfRevenue': {'raw': quarterly.loc['Cost Of Revenue', col] if 'Cost Of Revenue' in quarterly.index else None},
-            'grossProfit': {'raw': quarterly.loc['Gross Profit', col] if 'Gross Profit' in quarterly.index else None},
-            'operatingIncome': {'raw': quarterly.loc['Operating Income', col] if 'Operating Income' in quarterly.index else None},
-            'netIncome': {'raw': quarterly.loc['Net Income', col] if 'Net Income' in quarterly.index else None}
-          }
-          result['incomeStatementHistoryQuarterly']['incomeStatementHistory'].append(statement)
-    
+    for module in STATEMENT_SCHEDULE:
+      if module in requested:
+        result[module] = {'incomeStatementHistory': statement_cache.get(stock_ticker, module)}
     return result
   except Exception as e:
     print(f"Error fetching data with yfinance: {e}")
     return None
 
-def fetch_yahoo_finance_chart(stock_ticker: str, interval: str = "1d", range_period: str = "1mo") -> dict:
+# Local OHLCV history store settings
+STOCK_HISTORY_DIR = os.getenv("STOCK_HISTORY_DIR", "data/stock_history")
+HISTORY_SYNC_INTERVAL = 15 * 60  # seconds before the latest bars are synced again
+HISTORY_COLUMNS = ('open', 'high', 'low', 'close', 'volume')
+
+# Intraday settings: minutes per supported bar interval, and how long Yahoo
+# Finance keeps (and how many days one request may span for) each base
+# interval that is actually downloaded and stored
+INTRADAY_INTERVALS = {'1m': 1, '2m': 2, '5m': 5, '15m': 15, '30m': 30, '1h': 60}
+INTRADAY_BASES = {'1m': {'retention_days': 29, 'chunk_days': 7},
+                  '5m': {'retention_days': 59, 'chunk_days': 59}}
+INTRADAY_SESSION_OPEN = '9h30min'  # regular US session open, resampled bins are anchored on it
+INTRADAY_DEFAULT_DAYS = 5  # window searched for the latest session when no dates are given
+INTRADAY_MAX_BARS = 2000
+
+# Multi-ticker batch settings
+BATCH_MAX_TICKERS = 100
+PORTFOLIO_MAX_TICKERS = 500
+PORTFOLIO_MATRIX_MAX_TICKERS = 20  # larger baskets report the most correlated pairs instead
+PORTFOLIO_TOP_PAIRS = 10
+
+
+def download_history(stock_ticker: str, interval: str, start: datetime.date, end: datetime.date):
+  """Download OHLCV bars from Yahoo Finance for an exact, inclusive date window
+
+  Returns:
+      pandas.DataFrame: yfinance history frame (may be empty)
+  """
+  ticker = yf.Ticker(stock_ticker)
+  chunk_days = INTRADAY_BASES.get(interval, {}).get('chunk_days')
+  if chunk_days is None:
+    # yfinance treats `end` as exclusive
+    return ticker.history(interval=interval, start=start.isoformat(),
+                          end=(end + datetime.timedelta(days=1)).isoformat())
+
+  # Yahoo rejects intraday requests spanning more than a few days, split the window
+  frames = []
+  while start <= end:
+    chunk_end = min(end, start + datetime.timedelta(days=chunk_days - 1))
+    frames.append(ticker.history(interval=interval, start=start.isoformat(),
+                                 end=(chunk_end + datetime.timedelta(days=1)).isoformat()))
+    start = chunk_end + datetime.timedelta(days=1)
+  frames = [frame for frame in frames if not frame.empty]
+  return pd.concat(frames) if frames else pd.DataFrame()
+
+
+class HistoryStore:
+  """Incremental on-disk OHLCV history store backed by NumPy column files.
+
+  Every ticker/interval pair lives in its own directory with one `.npy` file
+  per column (`ts` in epoch seconds plus OHLCV) and a small `meta.json` that
+  records the exchange timezone and the date ranges already downloaded.
+  Columns are memory-mapped on read, so a date-range query is a binary search
+  and a slice, and a sync only downloads the parts of the requested window
+  that no earlier request has covered.
+  """
+
+  def __init__(self, root: str, sync_interval: float):
+    self.root = root
+    self.sync_interval = sync_interval
+    self._locks = {}
+    self._locks_guard = threading.Lock()
+    self.upstream_fetches = 0
+    self.local_syncs = 0
+
+  def _lock(self, path: str) -> threading.Lock:
+    with self._locks_guard:
+      return self._locks.setdefault(path, threading.Lock())
+
+  def _count(self, counter: str) -> None:
+    # Per-ticker locks do not serialise syncs of different tickers
+    with self._locks_guard:
+      setattr(self, counter, getattr(self, counter) + 1)
+
+  def _path(self, stock_ticker: str, interval: str) -> str:
+    return os.path.join(self.root, interval, ticker_symbol(stock_ticker))
+
+  @staticmethod
+  def _read_meta(path: str) -> dict:
+    try:
+      with open(os.path.join(path, 'meta.json')) as f:
+        return json.load(f)
+    except (OSError, ValueError):
+      return None
+
+  @staticmethod
+  def _load(path: str, meta: dict) -> dict:
+    """Memory-map every column of a stored series"""
+    if not meta or not meta.get('rows'):
+      return None
+    rows = meta['rows']
+    return {name: np.load(os.path.join(path, f"{name}.npy"), mmap_mode='r')[:rows]
+            for name in ('ts',) + HISTORY_COLUMNS}
+
+  @staticmethod
+  def _write(path: str, columns: dict, meta: dict) -> None:
+    """Atomically replace each column file, then the metadata"""
+    os.makedirs(path, exist_ok=True)
+    for name, values in columns.items():
+      tmp = os.path.join(path, f"{name}.npy.tmp")
+      with open(tmp, 'wb') as f:
+        np.save(f, values)
+      os.replace(tmp, os.path.join(path, f"{name}.npy"))
+    tmp = os.path.join(path, 'meta.json.tmp')
+    with open(tmp, 'w') as f:
+      json.dump(meta, f)
+    os.replace(tmp, os.path.join(path, 'meta.json'))
+
+  @staticmethod
+  def _frame_to_columns(hist) -> dict:
+    columns = {'ts': hist.index.asi8 // 1_000_000_000}
+    for name in HISTORY_COLUMNS:
+      columns[name] = hist[name.capitalize()].to_numpy(dtype=np.float64)
+    return columns
+
+  @staticmethod
+  def _merge(stored: dict, fetched: dict) -> dict:
+    """Merge two column sets by timestamp, freshly fetched bars win"""
+    if stored is None:
+      return fetched
+    ts = np.concatenate([fetched['ts'], stored['ts']])
+    # np.unique keeps the first occurrence, i.e. the fetched bar
+    _, index = np.unique(ts, return_index=True)
+    return {name: np.concatenate([fetched[name], stored[name]])[index] for name in fetched}
+
+  @staticmethod
+  def _merge_ranges(ranges: list) -> list:
+    """Coalesce overlapping or adjacent (start, end) date ranges"""
+    merged = []
+    for start, end in sorted(ranges):
+      if merged and start <= merged[-1][1] + datetime.timedelta(days=1):
+        merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+      else:
+        merged.append((start, end))
+    return merged
+
+  @staticmethod
+  def _missing_windows(ranges: list, start: datetime.date, end: datetime.date) -> list:
+    """Return the parts of [start, end] not covered by the given merged ranges"""
+    windows = []
+    cursor = start
+    for range_start, range_end in ranges:
+      if range_end < cursor:
+        continue
+      if range_start > end:
+        break
+      if range_start > cursor:
+        windows.append((cursor, range_start - datetime.timedelta(days=1)))
+      cursor = max(cursor, range_end + datetime.timedelta(days=1))
+    if cursor <= end:
+      windows.append((cursor, end))
+    return windows
+
+  def _untried_windows(self, meta: dict, ranges: list, start: datetime.date, end: datetime.date,
+                       now: float) -> list:
+    """The missing windows, minus those that came back empty less than the sync interval ago"""
+    tried = [(datetime.date.fromisoformat(a), datetime.date.fromisoformat(b))
+             for a, b, tried_at in meta.get('empty', []) if now - tried_at < self.sync_interval]
+    return [(window_start, window_end) for window_start, window_end in self._missing_windows(ranges, start, end)
+            if not any(a <= window_start and window_end <= b for a, b in tried)]
+
+  @staticmethod
+  def _day_bounds(meta: dict, start: datetime.date, end: datetime.date) -> tuple:
+    """Convert an inclusive date window to epoch seconds in the exchange timezone"""
+    tz = ZoneInfo(meta.get('tz') or 'UTC')
+    start_ts = None if start is None else int(datetime.datetime.combine(start, datetime.time(), tz).timestamp())
+    end_ts = None if end is None else int(datetime.datetime.combine(
+      end + datetime.timedelta(days=1), datetime.time(), tz).timestamp()) - 1
+    return start_ts, end_ts
+
+  def sync(self, stock_ticker: str, interval: str, start: datetime.date, end: datetime.date) -> dict:
+    """Make sure every bar between start and end (inclusive) is stored locally.
+
+    Only the sub-windows that were never downloaded are fetched, plus the
+    most recent bars when the window reaches today and the last sync is
+    older than the sync interval. yfinance reports failures (rate limits,
+    network errors) as an empty frame, so a window only counts as
+    downloaded once it returned bars, or if it has no weekday to trade on.
+    Other empty windows (holidays, today before the open, failures) are
+    remembered and tried again once the sync interval has passed.
+
+    Returns:
+        dict: The series metadata, or None if Yahoo Finance has no data
+    """
+    path = self._path(stock_ticker, interval)
+    today = datetime.date.today()
+    end = min(end, today)
+    if start > end:
+      return None
+    with self._lock(path):
+      meta = self._read_meta(path) or {}
+      has_data = bool(meta.get('rows'))
+      ranges = [] if not has_data else [
+        (datetime.date.fromisoformat(a), datetime.date.fromisoformat(b)) for a, b in meta.get('ranges', [])]
+      now = time.time()
+      windows = self._untried_windows(meta, ranges, start, end, now)
+      if has_data and end >= today and now - meta.get('synced_at', 0) >= self.sync_interval:
+        # Re-fetch from the last stored bar so a partial trading day is refreshed
+        last_ts = int(np.load(os.path.join(path, 'ts.npy'), mmap_mode='r')[meta['rows'] - 1])
+        last_day = datetime.datetime.fromtimestamp(last_ts, ZoneInfo(meta.get('tz') or 'UTC')).date()
+        windows.append((max(start, last_day), end))
+      if not windows:
+        # Fully covered: answered from metadata alone, no column is read
+        self._count('local_syncs')
+        return meta
+
+      columns, tz = self._load(path, meta), meta.get('tz')
+      covered, empty = [], []
+      for window_start, window_end in windows:
+        hist = download_history(stock_ticker, interval, window_start, window_end)
+        self._count('upstream_fetches')
+        if not hist.empty:
+          tz = str(hist.index.tz) if hist.index.tz is not None else tz
+          columns = self._merge(columns, self._frame_to_columns(hist))
+          covered.append((window_start, window_end))
+        elif not np.busday_count(window_start, window_end + datetime.timedelta(days=1)):
+          covered.append((window_start, window_end))  # a weekend, nothing to fetch
+        else:
+          empty.append([window_start.isoformat(), window_end.isoformat(), now])
+      if columns is None:
+        return None
+
+      columns = {name: np.array(values) for name, values in columns.items()}
+      ranges = self._merge_ranges(ranges + covered)
+      tried = [entry for entry in meta.get('empty', []) if now - entry[2] < self.sync_interval]
+      meta = {
+        'tz': tz,
+        'ranges': [[a.isoformat(), b.isoformat()] for a, b in ranges],
+        'empty': tried + empty,
+        'synced_at': now,
+        'rows': int(len(columns['ts']))
+      }
+      # Only the metadata changes when no window returned bars
+      self._write(path, columns if covered else {}, meta)
+      return meta
+
+  def query(self, stock_ticker: str, interval: str, start: datetime.date = None, end: datetime.date = None):
+    """Read the stored bars between start and end (inclusive) straight from disk
+
+    Returns:
+        pandas.DataFrame: OHLCV columns indexed by bar time in the exchange
+        timezone, or None if nothing is stored
+    """
+    path = self._path(stock_ticker, interval)
+    with self._lock(path):
+      meta = self._read_meta(path)
+      stored = self._load(path, meta)
+      if stored is None:
+        return None
+      start_ts, end_ts = self._day_bounds(meta, start, end)
+      ts = stored['ts']
+      lo = 0 if start_ts is None else int(np.searchsorted(ts, start_ts, side='left'))
+      hi = len(ts) if end_ts is None else int(np.searchsorted(ts, end_ts, side='right'))
+      index = pd.to_datetime(stored['ts'][lo:hi], unit='s', utc=True).tz_convert(meta.get('tz') or 'UTC')
+      return pd.DataFrame({name: np.array(stored[name][lo:hi]) for name in HISTORY_COLUMNS}, index=index)
+
+  def covers(self, stock_ticker: str, interval: str, start: datetime.date, end: datetime.date) -> bool:
+    """Whether every day between start and end was already downloaded, from metadata alone"""
+    meta = self._read_meta(self._path(stock_ticker, interval))
+    if not meta or not meta.get('rows'):
+      return False
+    ranges = [(datetime.date.fromisoformat(a), datetime.date.fromisoformat(b)) for a, b in meta.get('ranges', [])]
+    return not self._untried_windows(meta, ranges, start, min(end, datetime.date.today()), time.time())
+
+  def stats(self) -> dict:
+    return {
+      'upstream_fetches': self.upstream_fetches,
+      'local_syncs': self.local_syncs,
+    }
+
+
+history_store = HistoryStore(STOCK_HISTORY_DIR, sync_interval=HISTORY_SYNC_INTERVAL)
+
+def fetch_yahoo_finance_chart(stock_ticker: str, interval: str = "1d",
+                              start_date: datetime.date = None, end_date: datetime.date = None):
   """Helper function to fetch chart data using yfinance
+
+  Bars are served from the local history store, which only goes to Yahoo
+  Finance for the parts of the window it has not downloaded before, and
+  concurrent identical requests share one sync.
   
   Args:
       stock_ticker: Alphanumeric stock ticker symbol
       interval: Data interval (e.g., "1d" for daily)
-      range_period: Time range (e.g., "1mo" for one month)
+      start_date: First day of the window (defaults to one month before end_date)
+      end_date: Last day of the window, inclusive (defaults to today)
       
   Returns:
-      dict: The parsed chart data in a structure compatible with the original API
-  
-  Raises:
-      Exception: If there's an error in the request
+      pandas.DataFrame: OHLCV bars in the window (possibly empty), or None if
+      no data could be retrieved for the ticker
   """
   try:
-    # Convert Yahoo Finance API period to yfinance period
-    period_map = {
-      "1d": "1d",
-      "5d": "5d",
-      "7d": "7d", 
-      "1mo": "1mo",
-      "3mo": "3mo",
-      "6mo": "6mo",
-      "1y": "1y",
-      "2y": "2y",
-      "5y": "5y",
-      "max": "max"
-    }
-    
-    period = period_map.get(range_period, "1mo")
+    end_date = end_date or datetime.date.today()
+    start_date = start_date or end_date - datetime.timedelta(days=30)
     
-    # Get historical data using yfinance
-    ticker = yf.Ticker(stock_ticker)
-    hist = ticker.history(period=period, interval=interval)
-    
-    if hist.empty:
-      return None
-    
-    # Format data to match the structure expected by the original code
-    result = {
-      'timestamp': [int(date.timestamp()) for date in hist.index],
-      'indicators': {
-        'quote': [{
-          'close': hist['Close'].tolist()
-        }]
-      }
-    }
-    
-    return result
+    key = ('chart', stock_ticker.strip().upper(), interval, start_date, end_date)
+    return yahoo_singleflight.do(key, _load_chart, stock_ticker, interval, start_date, end_date)
   except Exception as e:
     print(f"Error fetching chart data with yfinance: {e}")
     return None
 
+def _load_chart(stock_ticker: str, interval: str, start_date: datetime.date, end_date: datetime.date):
+  if history_store.sync(stock_ticker, interval, start_date, end_date) is None:
+    return None
+  return history_store.query(stock_ticker, interval, start_date, end_date)
+
+def fetch_yahoo_finance_charts(stock_tickers: list, interval: str = "1d",
+                               start_date: datetime.date = None, end_date: datetime.date = None) -> dict:
+  """Fetch chart data for many tickers at once
+
+  Tickers already covered by the history store are read from disk, the rest
+  are downloaded concurrently so a whole watchlist costs about one round trip.
+  Symbols Yahoo Finance is known not to serve are not downloaded.
+
+  Returns:
+      dict: Ticker to DataFrame (or None when no data could be retrieved)
+  """
+  def fetch(stock_ticker):
+    try:
+      if not ticker_exists(stock_ticker):
+        return None
+    except Exception as e:
+      # Let the chart download decide
+      logger.debug(f"Ticker info lookup failed for {stock_ticker}: {e}")
+    return fetch_yahoo_finance_chart(stock_ticker, interval, start_date, end_date)
+  return dict(zip(stock_tickers, download_pool.map(fetch, stock_tickers)))
+
+def intraday_base(stock_ticker: str, interval: str, start_date: datetime.date, end_date: datetime.date) -> str:
+  """Pick the stored base interval an intraday interval is resampled from
+
+  A base qualifies when it divides the requested interval and Yahoo Finance
+  still keeps bars that old. A base that already covers the window wins so
+  every granularity reuses the same download, otherwise the coarsest one is
+  fetched because it has the longest retention and the fewest rows.
+
+  Raises:
+      ValueError: With a user facing message when no base reaches back to start_date
+  """
+  minutes = INTRADAY_INTERVALS[interval]
+  age = (datetime.date.today() - start_date).days
+  candidates = [base for base, limits in INTRADAY_BASES.items()
+                if minutes % INTRADAY_INTERVALS[base] == 0 and age <= limits['retention_days']]
+  if not candidates:
+    longest = max(limits['retention_days'] for base, limits in INTRADAY_BASES.items()
+                  if minutes % INTRADAY_INTERVALS[base] == 0)
+    raise ValueError(f"{interval} bars are only available for the last {longest} days.")
+  for base in candidates:
+    if history_store.covers(stock_ticker, base, start_date, end_date):
+      return base
+  return max(candidates, key=INTRADAY_INTERVALS.get)
+
+def resample_bars(bars: pd.DataFrame, interval: str) -> pd.DataFrame:
+  """Aggregate OHLCV bars to a coarser interval
+
+  Intraday bins are anchored on the session open in exchange time, so hourly
+  bars line up as 9:30, 10:30, ... like Yahoo's own even when the opening
+  bars are missing. "1d" groups by exchange local trading date. Bins
+  without trades are dropped.
+  """
+  aggregation = {'open': 'first', 'high': 'max', 'low': 'min', 'close': 'last', 'volume': 'sum'}
+  if bars.empty:
+    return bars
+  if interval == '1d':
+    daily = bars.groupby(bars.index.normalize()).agg(aggregation)
+    return daily.dropna(subset=['close'])
+  # Every interval divides a day, so anchoring on the first day's open aligns all days
+  resampled = bars.resample(f"{INTRADAY_INTERVALS[interval]}min", origin='start_day',
+                            offset=INTRADAY_SESSION_OPEN).agg(aggregation)
+  return resampled.dropna(subset=['close'])
+
+def fetch_yahoo_finance_bars(stock_ticker: str, interval: str, start_date: datetime.date, end_date: datetime.date):
+  """Fetch OHLCV bars at any supported interval
+
+  Daily bars come straight from the history store. Intraday intervals are
+  resampled locally from stored 1m or 5m bars, so asking for 15m after 5m (or
+  1h after 1m) does not go back to Yahoo Finance.
+
+  Raises:
+      ValueError: When the interval is unsupported or the window is too old for intraday data
+  """
+  if interval == '1d':
+    return fetch_yahoo_finance_chart(stock_ticker, '1d', start_date, end_date)
+  if interval not in INTRADAY_INTERVALS:
+    raise ValueError(f"Invalid interval: {interval}. Use one of: 1d, {', '.join(INTRADAY_INTERVALS)}.")
+  base = intraday_base(stock_ticker, interval, start_date, end_date)
+  bars = fetch_yahoo_finance_chart(stock_ticker, base, start_date, end_date)
+  if bars is None or interval == base:
+    return bars
+  return resample_bars(bars, interval)
+
+def aligned_closes(frames: dict) -> pd.DataFrame:
+  """Align close series from several exchanges on their local trading dates"""
+  columns = {}
+  for ticker, frame in frames.items():
+    if frame is not None:
+      closes = frame['close'].dropna()
+      if not closes.empty:
+        closes.index = closes.index.tz_localize(None).normalize()
+        columns[ticker] = closes[~closes.index.duplicated(keep='last')]
+  return pd.DataFrame(columns).sort_index()
+
+
+def parse_date_range(start_date: str = None, end_date: str = None, default_days: int = 7) -> tuple:
+  """Validate an optional YYYY-MM-DD date range, defaulting to the last `default_days` days
+
+  Returns:
+      tuple: (start, end) as datetime.date
+
+  Raises:
+      ValueError: With a user facing message when the range is invalid
+  """
+  today = datetime.date.today()
+  if not (start_date and end_date):
+    return today - datetime.timedelta(days=default_days), today
+  try:
+    start = datetime.datetime.strptime(start_date, '%Y-%m-%d').date()
+    end = datetime.datetime.strptime(end_date, '%Y-%m-%d').date()
+  except ValueError:
+    raise ValueError("Invalid date format. Please use YYYY-MM-DD format.")
+  if end <= start:
+    raise ValueError("End date must be after start date.")
+  if start > today or end > today:
+    raise ValueError("Date cannot be in the future.")
+  return start, end
+
+def format_dates(index: pd.DatetimeIndex, intraday: bool = False) -> np.ndarray:
+  """Exchange-local YYYY-MM-DD (or YYYY-MM-DD HH:MM) strings for a bar index, without a Python loop"""
+  if index.tz is not None:
+    index = index.tz_localize(None)
+  if intraday:
+    return np.char.replace(index.to_numpy().astype('datetime64[m]').astype(str), 'T', ' ')
+  return index.to_numpy().astype('datetime64[D]').astype(str)
+
+def format_price_lines(closes: pd.Series, intraday: bool = False) -> str:
+  """Render a close price series as "YYYY-MM-DD: $price" lines using vector operations"""
+  dates = format_dates(closes.index, intraday)
+  prices = np.char.mod('%.2f', closes.to_numpy())
+  return '\n'.join(np.char.add(np.char.add(dates, ': $'), prices).tolist())
+
+def percentage_change(closes: pd.Series) -> float:
+  """Percent move between the first and last close, None for fewer than two closes"""
+  if len(closes) < 2:
+    return None
+  first_price, last_price = closes.iat[0], closes.iat[-1]
+  return float((last_price - first_price) / first_price * 100)
+
+def format_percentage_change(closes: pd.Series, period_label: str) -> str:
+  """Describe the move between the first and last close of a series"""
+  change = percentage_change(closes)
+  if change is None:
+    return ""
+  change_direction = "up" if change >= 0 else "down"
+  return f"\nPrice changed {change_direction} {abs(change):.2f}% {period_label}."
+
 @stock_mcp.tool()
-def stock_price(stock_ticker: str, start_date: str = None, end_date: str = None) -> str:
+@run_in_stock_pool
+def stock_price(stock_ticker: str, start_date: str = None, end_date: str = None, interval: str = "1d",
+                output_format: str = "text") -> str | ToolResult:
   """
   Tool to get historical stock price information for a given ticker and optional date range.
 
@@ -138,142 +1273,646 @@ def stock_price(stock_ticker: str, start_date: str = None, end_date: str = None)
       start_date: Optional start date in YYYY-MM-DD format (e.g., "2023-07-01").
       end_date: Optional end date in YYYY-MM-DD format (e.g., "2023-07-25").
           - If both start_date and end_date are provided, returns prices for that range.
-          - If neither is provided, returns prices for the last 7 days.
+          - If neither is provided, returns prices for the last 7 days (the latest
+            trading session for intraday intervals).
+      interval: Bar interval, "1d" (default) or an intraday interval: "1m", "2m", "5m",
+          "15m", "30m" or "1h". Intraday bars only reach back 30 days for 1m and 2m,
+          60 days for the others.
+      output_format: "text" (default) or "compact" for structured, column-oriented JSON.
 
   Returns:
       str: Human-readable summary of stock price data.
   """
+  if output_format not in OUTPUT_FORMATS:
+      return f"Invalid output_format: {output_format}. Use one of: {', '.join(OUTPUT_FORMATS)}."
+  if interval != "1d" and interval not in INTRADAY_INTERVALS:
+      return f"Invalid interval: {interval}. Use one of: 1d, {', '.join(INTRADAY_INTERVALS)}."
+  intraday = interval != "1d"
   try:
-      # Validate stock ticker
-      ticker = yf.Ticker(stock_ticker)
-      # Quick check to see if the ticker is valid
-      if not ticker.info or ticker.info.get('regularMarketPrice') is None:
-          return f"Invalid ticker symbol: {stock_ticker}. Please provide a valid stock ticker."
+      # Validate stock ticker against the symbol directory or the shared metadata cache
+      error = validate_ticker(stock_ticker)
+      if error:
+          return error
+      
+      # Default to 7 days (enough to find the latest session intraday) if no date range is provided
+      try:
+          window = parse_date_range(start_date, end_date,
+                                    default_days=INTRADAY_DEFAULT_DAYS if intraday else 7)
+      except ValueError as e:
+          return str(e)
+
+      try:
+          result = fetch_yahoo_finance_bars(stock_ticker, interval, *window)
+      except ValueError as e:
+          return str(e)
       
-      # If date range is provided, fetch data for that range
+      if result is None:
+          return f"Could not retrieve price data for {stock_ticker}. The stock symbol may be invalid or there may be no data available."
+
+      # The store already sliced the requested window, only NaN bars are left to drop
+      closes = result['close'].dropna()
+      if intraday and not (start_date and end_date) and not closes.empty:
+          # Only the latest trading session by default
+          closes = closes[closes.index.normalize() == closes.index[-1].normalize()]
+      if intraday and len(closes) > INTRADAY_MAX_BARS:
+          return (f"Too many {interval} bars ({len(closes)}) for {stock_ticker}. "
+                  f"Please request a shorter date range or a coarser interval.")
+
       if start_date and end_date:
-          try:
-              # Parse the dates
-              start = datetime.datetime.strptime(start_date, '%Y-%m-%d')
-              end = datetime.datetime.strptime(end_date, '%Y-%m-%d')
-              
-              # Check if end date is after start date
-              if end <= start:
-                  return "End date must be after start date."
-                  
-              # Check if dates are in the future
-              today = datetime.datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
-              if start > today or end > today:
-                  return "Date cannot be in the future."
-              
-              # Calculate days between dates to determine appropriate range
-              days_diff = (end - start).days
-              
-              # Map to Yahoo Finance range values
-              if days_diff <= 5:
-                  range_period = "5d"
-              elif days_diff <= 30:
-                  range_period = "1mo"
-              elif days_diff <= 90:
-                  range_period = "3mo"
-              elif days_diff <= 180:
-                  range_period = "6mo"
-              elif days_diff <= 365:
-                  range_period = "1y"
-              elif days_diff <= 730:
-                  range_period = "2y"
-              else:
-                  range_period = "5y"
-              
-              result = fetch_yahoo_finance_chart(stock_ticker, interval="1d", range_period=range_period)
-          except ValueError:
-              return "Invalid date format. Please use YYYY-MM-DD format."
+          if closes.empty:
+              return f"No data available for {stock_ticker} in the date range {start_date} to {end_date}"
+          change_str = format_percentage_change(closes, "over this period")
+          text = f"Stock price for {stock_ticker} from {start_date} to {end_date}:\n{format_price_lines(closes, intraday)}{change_str}"
+      elif intraday:
+          if closes.empty:
+              return f"No intraday price data available for {stock_ticker} in the last {INTRADAY_DEFAULT_DAYS} days."
+          change_str = format_percentage_change(closes, "over the session")
+          text = (f"{interval} stock price for {stock_ticker} in the latest session ({closes.index[-1]:%Y-%m-%d}):\n"
+                  f"{format_price_lines(closes, intraday)}{change_str}")
       else:
-          # Default to 7 days if no date range is provided
-          range_period = "7d"
-          result = fetch_yahoo_finance_chart(stock_ticker, interval="1d", range_period=range_period)
-      
-      if result and 'timestamp' in result and 'indicators' in result:
-          timestamps = result['timestamp']
-          close_prices = result['indicators']['quote'][0]['close']
-          
-          # Create a series-like representation of the closing prices
-          price_data = {}
-          for i, ts in enumerate(timestamps):
-              if i < len(close_prices) and close_prices[i] is not None:  # Skip None values and check bounds
-                  date_str = datetime.datetime.fromtimestamp(ts).strftime('%Y-%m-%d')
-                  price_data[date_str] = close_prices[i]
-          
-          # If no data points were found
-          if not price_data:
-              return f"No price data available for {stock_ticker} in the specified period."
-          
-          # If date range was provided, filter to the specified range
-          if start_date and end_date:
-              filtered_data = {}
-              start = datetime.datetime.strptime(start_date, '%Y-%m-%d')
-              end = datetime.datetime.strptime(end_date, '%Y-%m-%d')
-              
-              for d in price_data:
-                  curr_date = datetime.datetime.strptime(d, '%Y-%m-%d')
-                  if start <= curr_date <= end:
-                      filtered_data[d] = price_data[d]
-              
-              # Calculate percentage change when there are multiple data points
-              price_points = list(filtered_data.items())
-              percentage_change = ""
-              if len(price_points) >= 2:
-                  first_price = price_points[0][1]
-                  last_price = price_points[-1][1]
-                  change = ((last_price - first_price) / first_price) * 100
-                  change_direction = "up" if change >= 0 else "down"
-                  percentage_change = f"\nPrice changed {change_direction} {abs(change):.2f}% over this period."
-              
-              # Format the date range output
-              if filtered_data:
-                  price_str = '\n'.join([f"{d}: ${filtered_data[d]:.2f}" for d in sorted(filtered_data.keys())])
-                  return f"Stock price for {stock_ticker} from {start_date} to {end_date}:\n{price_str}{percentage_change}"
-              else:
-                  return f"No data available for {stock_ticker} in the date range {start_date} to {end_date}"
-          
           # For the default case (last 7 days)
-          else:
-              # Calculate percentage change for the period
-              sorted_dates = sorted(price_data.keys())
-              percentage_change = ""
-              if len(sorted_dates) >= 2:
-                  first_date = sorted_dates[0]
-                  last_date = sorted_dates[-1]
-                  change = ((price_data[last_date] - price_data[first_date]) / price_data[first_date]) * 100
-                  change_direction = "up" if change >= 0 else "down"
-                  percentage_change = f"\nPrice changed {change_direction} {abs(change):.2f}% over the last 7 days."
-              
-              price_str = '\n'.join([f"{d}: ${price_data[d]:.2f}" for d in sorted_dates])
-              return f"Stock price over the last 7 days for {stock_ticker}:\n{price_str}{percentage_change}"
-      else:
-          return f"Could not retrieve price data for {stock_ticker}. The stock symbol may be invalid or there may be no data available."
+          if closes.empty:
+              return f"No price data available for {stock_ticker} in the specified period."
+          change_str = format_percentage_change(closes, "over the last 7 days")
+          text = f"Stock price over the last 7 days for {stock_ticker}:\n{format_price_lines(closes)}{change_str}"
+
+      if output_format == "compact":
+          change = percentage_change(closes)
+          return compact_output({
+              'ticker': stock_ticker.upper(),
+              'interval': interval,
+              'date': format_dates(closes.index, intraday).tolist(),
+              'close': compact_values(closes),
+              'change_pct': None if change is None else round(change, PRICE_DECIMALS)
+          }, text)
+      return text
   except Exception as e:
       return f"Error retrieving stock price for {stock_ticker}: {str(e)}"
 
 @stock_mcp.tool()
-def stock_info(stock_ticker: str) -> str:
+@run_in_stock_pool
+def stock_prices(stock_tickers: list[str], start_date: str = None, end_date: str = None,
+                 output_format: str = "text") -> str | ToolResult:
+  """
+  Tool to get historical closing prices for several stock tickers in a single call.
+  Prefer this over calling stock_price once per ticker when comparing a watchlist.
+
+  Args:
+      stock_tickers: List of stock ticker symbols (e.g., ["AAPL", "MSFT", "NVDA"]).
+      start_date: Optional start date in YYYY-MM-DD format (e.g., "2023-07-01").
+      end_date: Optional end date in YYYY-MM-DD format (e.g., "2023-07-25").
+          - If both start_date and end_date are provided, returns prices for that range.
+          - If neither is provided, returns prices for the last 7 days.
+      output_format: "text" (default) or "compact" for structured, column-oriented JSON.
+
+  Returns:
+      str: A compact CSV table with one row per date and one closing price column per ticker,
+           followed by the percentage change of each ticker over the period.
+  """
+  if output_format not in OUTPUT_FORMATS:
+    return f"Invalid output_format: {output_format}. Use one of: {', '.join(OUTPUT_FORMATS)}."
+  tickers = list(dict.fromkeys(t.strip().upper() for t in stock_tickers if t and t.strip()))
+  if not tickers:
+    return "Please provide at least one stock ticker."
+  if len(tickers) > BATCH_MAX_TICKERS:
+    return f"Too many tickers: {len(tickers)}. Please request at most {BATCH_MAX_TICKERS} tickers at a time."
+
+  try:
+    start, end = parse_date_range(start_date, end_date)
+  except ValueError as e:
+    return str(e)
+
+  try:
+    table = aligned_closes(fetch_yahoo_finance_charts(tickers, "1d", start, end))
+    missing = [t for t in tickers if t not in table.columns]
+    if table.empty:
+      return f"No price data available for {', '.join(tickers)} from {start} to {end}."
+
+    table.index = table.index.strftime('%Y-%m-%d')
+    table.index.name = 'Date'
+    csv_table = table.to_csv(float_format='%.2f', lineterminator='\n').rstrip('\n')
+
+    first = table.bfill().iloc[0]
+    last = table.ffill().iloc[-1]
+    change = ((last - first) / first * 100).round(2)
+    change_str = ', '.join(f"{t} {c:+.2f}%" for t, c in change.items())
+
+    result = f"Closing prices from {start} to {end}:\n{csv_table}\nChange over period: {change_str}"
+    if missing:
+      result += f"\nNo data for: {', '.join(missing)}"
+    if output_format == "compact":
+      return compact_output({
+        'start': start.isoformat(),
+        'end': end.isoformat(),
+        'date': table.index.tolist(),
+        'close': {ticker: compact_values(table[ticker]) for ticker in table.columns},
+        'change_pct': dict(zip(change.index, compact_values(change))),
+        'missing': missing
+      }, result)
+    return result
+  except Exception as e:
+    logger.error(f"Error in stock_prices for {tickers}: {str(e)}")
+    return f"Error retrieving stock prices: {str(e)}"
+
+# Technical indicator settings
+TRADING_DAYS_PER_YEAR = 252
+RSI_PERIOD = 14
+MACD_FAST, MACD_SLOW, MACD_SIGNAL = 12, 26, 9
+BOLLINGER_STD = 2
+
+
+def _sma(close: pd.Series, window: int) -> pd.DataFrame:
+  return pd.DataFrame({f'sma_{window}': close.rolling(window).mean()})
+
+def _ema(close: pd.Series, window: int) -> pd.DataFrame:
+  return pd.DataFrame({f'ema_{window}': close.ewm(span=window, adjust=False).mean()})
+
+def _rsi(close: pd.Series, window: int) -> pd.DataFrame:
+  # Wilder's smoothing of average gains and losses
+  delta = close.diff()
+  gain = delta.clip(lower=0).ewm(alpha=1 / RSI_PERIOD, adjust=False, min_periods=RSI_PERIOD).mean()
+  loss = (-delta.clip(upper=0)).ewm(alpha=1 / RSI_PERIOD, adjust=False, min_periods=RSI_PERIOD).mean()
+  return pd.DataFrame({f'rsi_{RSI_PERIOD}': 100 - 100 / (1 + gain / loss)})
+
+def _macd(close: pd.Series, window: int) -> pd.DataFrame:
+  macd = close.ewm(span=MACD_FAST, adjust=False).mean() - close.ewm(span=MACD_SLOW, adjust=False).mean()
+  signal = macd.ewm(span=MACD_SIGNAL, adjust=False).mean()
+  return pd.DataFrame({'macd': macd, 'macd_signal': signal, 'macd_hist': macd - signal})
+
+def _bollinger(close: pd.Series, window: int) -> pd.DataFrame:
+  rolling = close.rolling(window)
+  mid, std = rolling.mean(), rolling.std(ddof=0)
+  return pd.DataFrame({
+    'bb_lower': mid - BOLLINGER_STD * std,
+    'bb_mid': mid,
+    'bb_upper': mid + BOLLINGER_STD * std
+  })
+
+def _volatility(close: pd.Series, window: int) -> pd.DataFrame:
+  # Annualised rolling standard deviation of log returns, in percent
+  log_returns = np.log(close).diff()
+  volatility = log_returns.rolling(window).std() * np.sqrt(TRADING_DAYS_PER_YEAR) * 100
+  return pd.DataFrame({f'volatility_{window}': volatility})
+
+def _drawdown(close: pd.Series, window: int) -> pd.DataFrame:
+  # Percent below the running peak
+  return pd.DataFrame({'drawdown': (close / close.cummax() - 1) * 100})
+
+INDICATORS = {
+  'sma': _sma,
+  'ema': _ema,
+  'rsi': _rsi,
+  'macd': _macd,
+  'bollinger': _bollinger,
+  'volatility': _volatility,
+  'drawdown': _drawdown,
+}
+
+
+def compute_indicators(close: pd.Series, indicators: list, window: int) -> pd.DataFrame:
+  """Compute several indicators over one close series with rolling vector operations
+
+  Returns:
+      pandas.DataFrame: The close column followed by one or more columns per indicator
+  """
+  return pd.concat([close.rename('close')] + [INDICATORS[name](close, window) for name in indicators], axis=1)
+
+
+@stock_mcp.tool()
+@run_in_stock_pool
+def stock_indicators(stock_ticker: str, indicators: list[str] = None, start_date: str = None,
+                     end_date: str = None, window: int = 20, latest_only: bool = False,
+                     output_format: str = "text") -> str | ToolResult:
+  """
+  Tool to compute technical indicators over a stock's daily closing prices.
+  Use this instead of computing indicators from raw prices yourself.
+
+  Args:
+      stock_ticker: Stock ticker symbol (e.g., "AAPL").
+      indicators: Indicators to compute, any of "sma", "ema", "rsi", "macd", "bollinger",
+          "volatility" (annualised, %) and "drawdown" (% below running peak). Defaults to all.
+      start_date: Optional start date in YYYY-MM-DD format (e.g., "2023-07-01").
+      end_date: Optional end date in YYYY-MM-DD format (e.g., "2023-07-25").
+          - If neither is provided, the last 3 months are used.
+      window: Look-back window in trading days for sma, ema, bollinger and volatility (default 20).
+      latest_only: If true, only return the indicator values for the last trading day.
+      output_format: "text" (default) or "compact" for structured, column-oriented JSON.
+
+  Returns:
+      str: A compact CSV table with one row per trading day and one column per indicator value.
+  """
+  if output_format not in OUTPUT_FORMATS:
+    return f"Invalid output_format: {output_format}. Use one of: {', '.join(OUTPUT_FORMATS)}."
+  names = list(dict.fromkeys(name.strip().lower() for name in (indicators or INDICATORS)))
+  unknown = [name for name in names if name not in INDICATORS]
+  if unknown:
+    return f"Unknown indicator(s): {', '.join(unknown)}. Available indicators: {', '.join(INDICATORS)}"
+  if window < 2:
+    return "Window must be at least 2 trading days."
+
+  try:
+    start, end = parse_date_range(start_date, end_date, default_days=91)
+  except ValueError as e:
+    return str(e)
+
+  try:
+    error = validate_ticker(stock_ticker)
+    if error:
+      return error
+
+    # Fetch enough extra history for the longest look-back to be warmed up at start
+    warmup_days = int(max(window, MACD_SLOW + MACD_SIGNAL, RSI_PERIOD) * 1.6) + 10
+    frame = fetch_yahoo_finance_chart(stock_ticker, "1d", start - datetime.timedelta(days=warmup_days), end)
+    if frame is None:
+      return f"Could not retrieve price data for {stock_ticker}."
+
+    close = frame['close'].dropna()
+    close.index = close.index.tz_localize(None).normalize()
+    in_range = close.index >= pd.Timestamp(start)
+    if not in_range.any():
+      return f"No price data available for {stock_ticker} from {start} to {end}."
+
+    # Drawdown is measured from the running peak inside the requested window only
+    table = compute_indicators(close, [n for n in names if n != 'drawdown'], window)[in_range]
+    if 'drawdown' in names:
+      table = table.join(_drawdown(close[in_range], window))
+    if latest_only:
+      table = table.tail(1)
+
+    table.index = table.index.strftime('%Y-%m-%d')
+    table.index.name = 'Date'
+    csv_table = table.to_csv(float_format='%.2f', lineterminator='\n').rstrip('\n')
+    text = f"Technical indicators for {stock_ticker} from {start} to {end} (window {window}):\n{csv_table}"
+    if output_format == "compact":
+      data = {'ticker': stock_ticker.upper(), 'window': window, 'date': table.index.tolist()}
+      data.update({column: compact_values(table[column]) for column in table.columns})
+      return compact_output(data, text)
+    return text
+  except Exception as e:
+    logger.error(f"Error in stock_indicators for {stock_ticker}: {str(e)}")
+    return f"Error computing indicators for {stock_ticker}: {str(e)}"
+
+def portfolio_statistics(returns: np.ndarray, weights: np.ndarray, benchmark: np.ndarray = None) -> dict:
+  """Covariance, correlation, volatility and beta of a basket in one vectorized pass
+
+  Args:
+      returns: T x N matrix of aligned daily returns
+      weights: N portfolio weights summing to 1
+      benchmark: Optional T vector of benchmark daily returns
+
+  Returns:
+      dict: Annualised per-asset and portfolio statistics as NumPy arrays/floats
+  """
+  centered = returns - returns.mean(axis=0)
+  cov = centered.T @ centered / (len(returns) - 1) * TRADING_DAYS_PER_YEAR
+  vol = np.sqrt(np.diag(cov))
+  with np.errstate(divide='ignore', invalid='ignore'):
+    corr = cov / np.outer(vol, vol)
+  portfolio_returns = returns @ weights
+  stats = {
+    'cov': cov,
+    'corr': corr,
+    'annual_return': returns.mean(axis=0) * TRADING_DAYS_PER_YEAR,
+    'annual_volatility': vol,
+    'portfolio_return': float(portfolio_returns.mean() * TRADING_DAYS_PER_YEAR),
+    'portfolio_volatility': float(np.sqrt(weights @ cov @ weights)),
+  }
+  if benchmark is not None:
+    bench_centered = benchmark - benchmark.mean()
+    bench_var = bench_centered @ bench_centered
+    stats['beta'] = centered.T @ bench_centered / bench_var
+    stats['portfolio_beta'] = float(weights @ stats['beta'])
+  return stats
+
+
+@stock_mcp.tool()
+@run_in_stock_pool
+def portfolio_analytics(stock_tickers: list[str], weights: list[float] = None, benchmark: str = "^GSPC",
+                        start_date: str = None, end_date: str = None, include_correlation: bool = True,
+                        output_format: str = "text") -> str | ToolResult:
+  """
+  Tool to analyse a basket of stocks: aligned daily returns, covariance/correlation,
+  portfolio volatility and beta against a benchmark index.
+
+  Args:
+      stock_tickers: List of stock ticker symbols (e.g., ["AAPL", "MSFT", "NVDA"]).
+      weights: Optional portfolio weights in the same order as stock_tickers (normalised to sum to 1).
+          Defaults to an equally weighted portfolio.
+      benchmark: Benchmark ticker used for beta (default "^GSPC", the S&P 500). Empty to skip beta.
+      start_date: Optional start date in YYYY-MM-DD format (e.g., "2023-07-01").
+      end_date: Optional end date in YYYY-MM-DD format (e.g., "2024-07-01").
+          - If neither is provided, the last year is used.
+      include_correlation: Include the correlation matrix (or, for large baskets, the most correlated pairs).
+      output_format: "text" (default) or "compact" for structured, column-oriented JSON.
+
+  Returns:
+      str: Portfolio summary followed by compact CSV tables of per-ticker statistics
+           (annualised return and volatility in %, beta) and correlations.
+  """
+  if output_format not in OUTPUT_FORMATS:
+    return f"Invalid output_format: {output_format}. Use one of: {', '.join(OUTPUT_FORMATS)}."
+  tickers = list(dict.fromkeys(t.strip().upper() for t in stock_tickers if t and t.strip()))
+  if len(tickers) < 2:
+    return "Please provide at least two stock tickers."
+  if len(tickers) > PORTFOLIO_MAX_TICKERS:
+    return f"Too many tickers: {len(tickers)}. Please request at most {PORTFOLIO_MAX_TICKERS} tickers at a time."
+  if weights is not None and len(weights) != len(tickers):
+    return f"Got {len(weights)} weights for {len(tickers)} unique tickers, please provide one weight per ticker."
+
+  try:
+    start, end = parse_date_range(start_date, end_date, default_days=365)
+  except ValueError as e:
+    return str(e)
+
+  try:
+    benchmark = benchmark.strip().upper() if benchmark and benchmark.strip() else None
+    symbols = tickers + ([benchmark] if benchmark and benchmark not in tickers else [])
+    closes = aligned_closes(fetch_yahoo_finance_charts(symbols, "1d", start, end))
+
+    missing = [t for t in tickers if t not in closes.columns]
+    available = [t for t in tickers if t in closes.columns]
+    if len(available) < 2:
+      return f"Not enough price data to analyse this basket from {start} to {end}."
+    if benchmark and benchmark not in closes.columns:
+      missing.append(f"{benchmark} (benchmark)")
+      benchmark = None
+
+    # Keep only the days on which every asset (and the benchmark) traded
+    returns = closes[available + ([benchmark] if benchmark else [])].pct_change(fill_method=None).dropna()
+    if len(returns) < 2:
+      return f"Not enough overlapping trading days to analyse this basket from {start} to {end}."
+
+    weight_by_ticker = dict(zip(tickers, weights)) if weights is not None else {}
+    w = np.array([weight_by_ticker.get(t, 1.0) for t in available], dtype=float)
+    if w.sum() == 0:
+      return "Weights must not sum to zero."
+    w = w / w.sum()
+
+    asset_returns = returns[available].to_numpy()
+    bench_returns = returns[benchmark].to_numpy() if benchmark else None
+    stats = portfolio_statistics(asset_returns, w, bench_returns)
+
+    per_ticker = pd.DataFrame({
+      'weight': w * 100,
+      'annual_return_pct': stats['annual_return'] * 100,
+      'annual_volatility_pct': stats['annual_volatility'] * 100,
+    }, index=pd.Index(available, name='Ticker'))
+    if benchmark:
+      per_ticker['beta'] = stats['beta']
+
+    summary = [
+      f"Portfolio analytics from {returns.index[0]:%Y-%m-%d} to {returns.index[-1]:%Y-%m-%d} "
+      f"({len(returns)} aligned trading days, {len(available)} tickers):",
+      f"Annualised return: {stats['portfolio_return'] * 100:.2f}%",
+      f"Annualised volatility: {stats['portfolio_volatility'] * 100:.2f}%",
+    ]
+    if benchmark:
+      summary.append(f"Beta vs {benchmark}: {stats['portfolio_beta']:.2f}")
+    if missing:
+      summary.append(f"No data for: {', '.join(missing)}")
+
+    sections = ['\n'.join(summary), "Per-ticker statistics:\n" +
+                per_ticker.to_csv(float_format='%.2f', lineterminator='\n').rstrip('\n')]
+
+    compact = {
+      'start': f"{returns.index[0]:%Y-%m-%d}",
+      'end': f"{returns.index[-1]:%Y-%m-%d}",
+      'trading_days': len(returns),
+      'portfolio': {
+        'annual_return_pct': round(stats['portfolio_return'] * 100, PRICE_DECIMALS),
+        'annual_volatility_pct': round(stats['portfolio_volatility'] * 100, PRICE_DECIMALS),
+      },
+      'ticker': available,
+      'weight_pct': compact_values(per_ticker['weight']),
+      'annual_return_pct': compact_values(per_ticker['annual_return_pct']),
+      'annual_volatility_pct': compact_values(per_ticker['annual_volatility_pct']),
+      'missing': missing
+    }
+    if benchmark:
+      compact['benchmark'] = benchmark
+      compact['portfolio']['beta'] = round(stats['portfolio_beta'], RATIO_DECIMALS)
+      compact['beta'] = compact_values(per_ticker['beta'], RATIO_DECIMALS)
+
+    if include_correlation:
+      corr = stats['corr']
+      if len(available) <= PORTFOLIO_MATRIX_MAX_TICKERS:
+        matrix = pd.DataFrame(corr, index=pd.Index(available, name='Ticker'), columns=available)
+        sections.append("Correlation matrix:\n" +
+                        matrix.to_csv(float_format='%.2f', lineterminator='\n').rstrip('\n'))
+        compact['correlation'] = [compact_values(row, RATIO_DECIMALS) for row in corr]
+      else:
+        rows, cols = np.triu_indices(len(available), k=1)
+        pair_corr = corr[rows, cols]
+        top = np.argsort(-np.nan_to_num(pair_corr, nan=-np.inf))[:PORTFOLIO_TOP_PAIRS]
+        pairs = '\n'.join(f"{available[rows[i]]},{available[cols[i]]},{pair_corr[i]:.2f}" for i in top)
+        sections.append(f"Most correlated pairs (average pairwise correlation "
+                        f"{np.nanmean(pair_corr):.2f}):\nPair1,Pair2,Correlation\n{pairs}")
+        compact['top_pairs'] = {
+          'ticker1': [available[rows[i]] for i in top],
+          'ticker2': [available[cols[i]] for i in top],
+          'correlation': compact_values(pair_corr[top], RATIO_DECIMALS)
+        }
+
+    text = '\n\n'.join(sections)
+    if output_format == "compact":
+      return compact_output(compact, text)
+    return text
+  except Exception as e:
+    logger.error(f"Error in portfolio_analytics for {tickers}: {str(e)}")
+    return f"Error computing portfolio analytics: {str(e)}"
+
+# Live quote streaming settings
+QUOTE_POLL_INTERVAL = 15      # default seconds between upstream polls of a ticker
+QUOTE_MIN_POLL_INTERVAL = 5   # floor on the polling cadence a client may request
+QUOTE_WATCH_MAX_DURATION = 60 * 60
+QUOTE_WATCH_MAX_TICKERS = 50
+
+
+def fetch_quote(stock_ticker: str) -> dict:
+  """Fetch the latest trade price of a ticker"""
+  info = yf.Ticker(stock_ticker).fast_info
+  return {
+    'price': float(info.last_price),
+    'previous_close': float(info.previous_close),
+    'time': time.time()
+  }
+
+
+class QuoteHub:
+  """Shares one upstream poll loop per ticker among all subscribers.
+
+  Each subscriber registers an asyncio.Queue and the cadence it wants, the
+  ticker's poller runs at the fastest requested cadence and only publishes a
+  quote to the subscribers when the price changed. A poller stops as soon as
+  its last subscriber leaves.
+  """
+
+  def __init__(self, min_interval: float):
+    self.min_interval = min_interval
+    self._pollers = {}  # ticker -> {'task', 'subscribers': {queue: interval}, 'latest'}
+    self.upstream_polls = 0
+    self.published = 0
+
+  def subscribe(self, stock_ticker: str, queue: asyncio.Queue, interval: float) -> None:
+    poller = self._pollers.get(stock_ticker)
+    if poller is None or poller['task'].done():
+      poller = self._pollers[stock_ticker] = {'subscribers': {}, 'latest': None}
+      poller['task'] = asyncio.create_task(self._poll(stock_ticker, poller))
+    poller['subscribers'][queue] = max(interval, self.min_interval)
+    if poller['latest'] is not None:
+      queue.put_nowait((stock_ticker, poller['latest']))
+
+  def unsubscribe(self, stock_ticker: str, queue: asyncio.Queue) -> None:
+    poller = self._pollers.get(stock_ticker)
+    if poller is not None:
+      poller['subscribers'].pop(queue, None)
+      if not poller['subscribers']:
+        poller['task'].cancel()
+        del self._pollers[stock_ticker]
+
+  async def _poll(self, stock_ticker: str, poller: dict) -> None:
+    while poller['subscribers']:
+      try:
+        quote = await stock_worker_pool.run("quote_poller", fetch_quote, stock_ticker)
+        self.upstream_polls += 1
+        latest = poller['latest']
+        if latest is None or quote['price'] != latest['price']:
+          poller['latest'] = quote
+          for queue in list(poller['subscribers']):
+            queue.put_nowait((stock_ticker, quote))
+            self.published += 1
+      except asyncio.CancelledError:
+        raise
+      except Exception as e:
+        logger.warning(f"Quote poll failed for {stock_ticker}: {e}")
+      await asyncio.sleep(min(poller['subscribers'].values(), default=self.min_interval))
+
+  def stats(self) -> dict:
+    return {
+      'active_pollers': len(self._pollers),
+      'subscribers': sum(len(p['subscribers']) for p in self._pollers.values()),
+      'upstream_polls': self.upstream_polls,
+      'published': self.published,
+    }
+
+
+quote_hub = QuoteHub(min_interval=QUOTE_MIN_POLL_INTERVAL)
+
+
+@stock_mcp.tool()
+async def watch_quotes(ctx: Context, stock_tickers: list[str], interval_seconds: int = QUOTE_POLL_INTERVAL,
+                       duration_seconds: int = 300, output_format: str = "text") -> str | ToolResult:
+  """
+  Tool to monitor live quotes for several tickers. Runs for duration_seconds and streams every
+  price change as a progress notification, instead of polling stock_price in a loop.
+
+  Args:
+      stock_tickers: List of stock ticker symbols to watch (e.g., ["AAPL", "MSFT"]).
+      interval_seconds: How often to check for new quotes (default 15, minimum 5).
+      duration_seconds: How long to keep watching before returning (default 300, maximum 3600).
+      output_format: "text" (default) or "compact" for a structured, column-oriented final summary.
+
+  Returns:
+      str: Summary of the watch with the last quote of each ticker. Intermediate changes are
+           delivered as progress notifications ("AAPL $189.12 (+0.54% today)").
+  """
+  if output_format not in OUTPUT_FORMATS:
+    return f"Invalid output_format: {output_format}. Use one of: {', '.join(OUTPUT_FORMATS)}."
+  tickers = list(dict.fromkeys(t.strip().upper() for t in stock_tickers if t and t.strip()))
+  if not tickers:
+    return "Please provide at least one stock ticker."
+  if len(tickers) > QUOTE_WATCH_MAX_TICKERS:
+    return f"Too many tickers: {len(tickers)}. Please watch at most {QUOTE_WATCH_MAX_TICKERS} tickers at a time."
+  duration_seconds = min(max(duration_seconds, 1), QUOTE_WATCH_MAX_DURATION)
+
+  queue = asyncio.Queue()
+  for ticker in tickers:
+    quote_hub.subscribe(ticker, queue, interval_seconds)
+
+  loop = asyncio.get_running_loop()
+  deadline = loop.time() + duration_seconds
+  latest = {}
+  updates = 0
+  try:
+    while (remaining := deadline - loop.time()) > 0:
+      try:
+        ticker, quote = await asyncio.wait_for(queue.get(), timeout=remaining)
+      except asyncio.TimeoutError:
+        break
+      if ticker in latest and latest[ticker]['price'] == quote['price']:
+        continue
+      latest[ticker] = quote
+      updates += 1
+      change = (quote['price'] - quote['previous_close']) / quote['previous_close'] * 100
+      await ctx.report_progress(progress=updates, message=f"{ticker} ${quote['price']:.2f} ({change:+.2f}% today)")
+  finally:
+    for ticker in tickers:
+      quote_hub.unsubscribe(ticker, queue)
+
+  lines = [f"{t}: ${latest[t]['price']:.2f}" if t in latest else f"{t}: no quote available" for t in tickers]
+  text = f"Watched {len(tickers)} ticker(s) for {duration_seconds}s, {updates} quote update(s). Last quotes:\n" + "\n".join(lines)
+  if output_format == "compact":
+    return compact_output({
+      'duration_seconds': duration_seconds,
+      'updates': updates,
+      'ticker': tickers,
+      'price': compact_values([latest[t]['price'] if t in latest else np.nan for t in tickers])
+    }, text)
+  return text
+
+@stock_mcp.tool()
+def symbol_lookup(query: str, limit: int = 10, output_format: str = "text") -> str | ToolResult:
+  """
+  Tool to look up stock ticker symbols offline by symbol, symbol prefix or company name.
+  Use this to find the right ticker before calling the other stock tools.
+
+  Args:
+      query: Ticker symbol, ticker prefix or part of a company name (e.g., "AAP", "Apple").
+      limit: Maximum number of matches to return (default 10).
+      output_format: "text" (default) or "compact" for structured, column-oriented JSON.
+
+  Returns:
+      str: Matching symbols with company name and exchange, one per line.
+  """
+  if output_format not in OUTPUT_FORMATS:
+    return f"Invalid output_format: {output_format}. Use one of: {', '.join(OUTPUT_FORMATS)}."
+  if not symbol_directory.size:
+    return "Symbol directory is not available. Configure STOCK_SYMBOLS_FILE with a symbol snapshot."
+  matches = symbol_directory.lookup(query, max(1, min(limit, 50)))
+  if not matches:
+    return f"No symbols found matching '{query}'."
+  lines = [f"{m['symbol']}: {m['name']} ({m['exchange']})" if m['exchange'] else f"{m['symbol']}: {m['name']}"
+           for m in matches]
+  text = f"Symbols matching '{query}':\n" + "\n".join(lines)
+  if output_format == "compact":
+    return compact_output({column: [m[column] for m in matches] for column in ('symbol', 'name', 'exchange')}, text)
+  return text
+
+@stock_mcp.tool()
+@run_in_stock_pool
+def stock_info(stock_ticker: str, output_format: str = "text") -> str | ToolResult:
     """
     Tool to fetch fundamental information about a stock ticker from Yahoo Finance.
     
     Args:
         stock_ticker: Stock ticker symbol (e.g., "AAPL", "MSFT").
+        output_format: "text" (default) or "compact" for structured JSON with raw values.
     
     Returns:
         str: A formatted string containing key information about the company including:
              company name, industry, sector, market cap, price metrics, dividend information,
              and business summary.
     """
+    if output_format not in OUTPUT_FORMATS:
+        return f"Invalid output_format: {output_format}. Use one of: {', '.join(OUTPUT_FORMATS)}."
     try:
-        # Get stock information using yfinance
-        ticker = yf.Ticker(stock_ticker)
-        
-        # Extract relevant information
-        company_info = ticker.info
+        # An unlisted ticker is checked through the cache the lookup below reads, so it is fetched once
+        error = validate_ticker(stock_ticker)
+        if error:
+            return error
+
+        # Get stock information from the shared metadata cache
+        company_info = ticker_info_cache.get(stock_ticker)
         
         # Select only the most relevant fields
         relevant_keys = [
@@ -318,7 +1957,17 @@ def stock_info(stock_ticker: str) -> str:
         if not formatted_info:
             return f"No detailed information available for {stock_ticker}"
             
-        return f"Background information for {stock_ticker}:\n" + "\n".join(formatted_info)
+        text = f"Background information for {stock_ticker}:\n" + "\n".join(formatted_info)
+        if output_format == "compact":
+            data = {'ticker': stock_ticker.upper()}
+            for key in relevant_keys:
+                value = company_info.get(key)
+                if isinstance(value, float):
+                    value = None if math.isnan(value) else round(value, 4 if key == 'dividendYield' else PRICE_DECIMALS)
+                if value is not None:
+                    data[key] = value
+            return compact_output(data, text)
+        return text
     except AttributeError:
         return f"Error: Invalid ticker symbol '{stock_ticker}' or information not available"
     except Exception as e:
@@ -326,13 +1975,16 @@ def stock_info(stock_ticker: str) -> str:
         return f"Error retrieving stock information for {stock_ticker}: {str(e)}"
 
 @stock_mcp.tool()
-def income_statement(stock_ticker: str, period: str = "quarterly") -> str:
+@run_in_stock_pool
+def income_statement(stock_ticker: str, period: str = "quarterly", output_format: str = "text") -> str | ToolResult:
     """
     Tool to get the income statement for a given stock ticker, supporting quarterly or yearly data.
 
     Args:
         stock_ticker: Alphanumeric stock ticker symbol (e.g., "AAPL", "MSFT").
         period: "quarterly" (default) or "yearly" to specify the type of income statement.
+        output_format: "text" (default) or "compact" for structured, column-oriented JSON
+            with values in USD millions.
 
     Returns:
         str: Income statement data in JSON format, including key financial metrics:
@@ -355,7 +2007,13 @@ def income_statement(stock_ticker: str, period: str = "quarterly") -> str:
           }
         ]
     """
+    if output_format not in OUTPUT_FORMATS:
+        return f"Invalid output_format: {output_format}. Use one of: {', '.join(OUTPUT_FORMATS)}."
     try:
+        error = validate_ticker(stock_ticker)
+        if error:
+            return error
+
         # Determine which module to fetch
         if period == "yearly":
             module_key = "incomeStatementHistory"
@@ -364,7 +2022,7 @@ def income_statement(stock_ticker: str, period: str = "quarterly") -> str:
             module_key = "incomeStatementHistoryQuarterly"
             label = "Quarterly"
 
-        result = fetch_yahoo_finance_data(stock_ticker, "incomeStatementHistory,incomeStatementHistoryQuarterly")
+        result = fetch_yahoo_finance_data(stock_ticker, module_key)
 
         if result and module_key in result:
             statements = result[module_key]['incomeStatementHistory']
@@ -400,17 +2058,349 @@ def income_statement(stock_ticker: str, period: str = "quarterly") -> str:
                 data = data[:1]
 
             formatted_data = json.dumps(data, indent=2)
-            return f"{label} income statement for {stock_ticker}:\n{formatted_data}"
+            text = f"{label} income statement for {stock_ticker}:\n{formatted_data}"
+            if output_format == "compact":
+                statements = sorted(statements, key=lambda st: st['endDate']['raw'], reverse=True)[:len(data)]
+                compact = {
+                    'ticker': stock_ticker.upper(),
+                    'period': label.lower(),
+                    'unit': 'USD millions',
+                    'date': [entry['Date'] for entry in data]
+                }
+                for key in INCOME_STATEMENT_ROWS:
+                    values = [st.get(key, {}).get('raw') for st in statements]
+                    compact[key] = compact_values([np.nan if v is None else v / 1_000_000 for v in values])
+                return compact_output(compact, text)
+            return text
         else:
             return f"Could not retrieve {label.lower()} income statement for {stock_ticker}"
     except Exception as e:
         return f"Error retrieving income statement for {stock_ticker}: {str(e)}"
 
+# Fundamentals screener settings
+STOCK_SCREEN_INDEX = os.getenv("STOCK_SCREEN_INDEX", "data/stock_screen/index.npz")
+SCREEN_REFRESH_INTERVAL = 24 * 60 * 60  # seconds before an indexed symbol is refreshed
+SCREEN_REFRESH_THREADS = 8  # refresh downloads running at once, out of the shared download pool
+SCREEN_CHECKPOINT_ROWS = 500  # rows fetched between index saves during a refresh
+SCREEN_MAX_RESULTS = 200
+SCREEN_TEXT_FIELDS = ('name', 'sector', 'industry')
+SCREEN_NUMERIC_FIELDS = {  # field -> unit, as accepted by min_values/max_values
+  'price': 'USD',
+  'market_cap': 'USD billions',
+  'trailing_pe': 'ratio',
+  'forward_pe': 'ratio',
+  'dividend_yield': 'percent',
+  'revenue': 'USD billions, latest fiscal year',
+  'revenue_growth': 'percent, latest fiscal year over the prior one',
+  'gross_margin': 'percent',
+  'operating_margin': 'percent',
+  'net_margin': 'percent',
+}
+SCREEN_DEFAULT_COLUMNS = ('market_cap', 'trailing_pe', 'dividend_yield', 'revenue_growth', 'net_margin')
+
+
+def screen_row(stock_ticker: str) -> dict:
+  """Collect the screener fields of one ticker from its info and cached annual statements"""
+  info = yahoo_singleflight.do(('info', stock_ticker), TickerInfoCache._fetch, stock_ticker)
+  row = {'symbol': stock_ticker, 'updated_at': time.time()}
+  row['name'] = str(info.get('longName') or info.get('shortName') or '')
+  row['sector'] = str(info.get('sector') or '')
+  row['industry'] = str(info.get('industry') or '')
+
+  def number(key, scale=1.0):
+    value = info.get(key)
+    return float(value) * scale if isinstance(value, (int, float)) else np.nan
+
+  row['price'] = number('regularMarketPrice')
+  row['market_cap'] = number('marketCap', 1e-9)
+  row['trailing_pe'] = number('trailingPE')
+  row['forward_pe'] = number('forwardPE')
+  row['dividend_yield'] = number('dividendYield', 100)
+
+  try:
+    statements = statement_cache.get(stock_ticker, 'incomeStatementHistory') if TickerInfoCache.is_valid(info) else []
+  except Exception as e:
+    logger.debug(f"Screener statements unavailable for {stock_ticker}: {e}")
+    statements = []
+  statements = sorted(statements, key=lambda st: st['endDate']['raw'], reverse=True)
+
+  def raw(statement, key):
+    value = (statement.get(key) or {}).get('raw')
+    return np.nan if value is None else float(value)
+
+  latest = statements[0] if statements else {}
+  revenue = raw(latest, 'totalRevenue')
+  previous = raw(statements[1], 'totalRevenue') if len(statements) > 1 else np.nan
+  row['revenue'] = revenue * 1e-9
+  row['revenue_growth'] = (revenue / previous - 1) * 100 if previous and not np.isnan(previous) else np.nan
+  for field, key in (('gross_margin', 'grossProfit'), ('operating_margin', 'operatingIncome'),
+                     ('net_margin', 'netIncome')):
+    row[field] = raw(latest, key) / revenue * 100 if revenue else np.nan
+  return row
+
+
+class FundamentalsIndex:
+  """Precomputed, columnar fundamentals index for interactive screening.
+
+  One NumPy array per field (sorted by symbol) is kept in memory and saved
+  as a single `.npz` file, so a screen is a handful of vectorised
+  comparisons over thousands of symbols and never touches the network.
+  The index is refreshed in a background thread: symbols older than
+  `refresh_interval` are re-fetched (ticker info, plus annual statements
+  through the statement cache) and saved every `checkpoint_rows` rows.
+  """
+
+  def __init__(self, path: str, refresh_interval: float, threads: int, checkpoint_rows: int):
+    self.path = path
+    self.refresh_interval = refresh_interval
+    self.threads = threads
+    self.checkpoint_rows = checkpoint_rows
+    self._lock = threading.Lock()
+    self._columns = None
+    self._refresh_thread = None
+    self._pending = 0
+    self.refreshes = 0
+    self.fetched_rows = 0
+    self.screens = 0
+
+  def _empty(self) -> dict:
+    columns = {'symbol': np.array([], dtype=str), 'updated_at': np.array([], dtype=np.float64)}
+    columns.update({field: np.array([], dtype=str) for field in SCREEN_TEXT_FIELDS})
+    columns.update({field: np.array([], dtype=np.float64) for field in SCREEN_NUMERIC_FIELDS})
+    return columns
+
+  def columns(self) -> dict:
+    """The current column arrays, loaded from disk on first use"""
+    with self._lock:
+      if self._columns is None:
+        self._columns = self._empty()
+        try:
+          with np.load(self.path, allow_pickle=False) as stored:
+            columns = {name: stored[name] for name in stored.files}
+          if set(self._columns) <= set(columns):
+            self._columns = {name: columns[name] for name in self._columns}
+        except (OSError, ValueError) as e:
+          logger.debug(f"No screener index loaded from {self.path}: {e}")
+      return self._columns
+
+  def _save(self, columns: dict) -> None:
+    os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+    tmp = f"{self.path}.tmp"
+    with open(tmp, 'wb') as f:
+      np.savez(f, **columns)
+    os.replace(tmp, self.path)
+
+  def _merge(self, rows: list) -> None:
+    """Upsert fetched rows into the index, then swap and save the new columns"""
+    fetched = pd.DataFrame(rows)
+    with self._lock:
+      current = pd.DataFrame(self._columns)
+    merged = pd.concat([current[~current['symbol'].isin(fetched['symbol'])], fetched])
+    merged = merged.sort_values('symbol', kind='stable')
+    columns = {}
+    for name in self._empty():
+      dtype = np.float64 if name == 'updated_at' or name in SCREEN_NUMERIC_FIELDS else str
+      columns[name] = merged[name].to_numpy(dtype=dtype)
+    with self._lock:
+      self._columns = columns
+    self._save(columns)
+
+  def stale_symbols(self, universe: np.ndarray) -> np.ndarray:
+    """Universe symbols that are missing from the index or older than the refresh interval"""
+    columns = self.columns()
+    fresh = columns['symbol'][columns['updated_at'] > time.time() - self.refresh_interval]
+    return universe[~np.isin(universe, fresh)]
+
+  def refresh(self, universe: np.ndarray) -> int:
+    """Fetch every stale symbol of the universe, returning the number of rows fetched"""
+    stale = self.stale_symbols(universe)
+    self._pending = len(stale)
+    fetched = 0
+    for offset in range(0, len(stale), self.checkpoint_rows):
+      chunk = stale[offset:offset + self.checkpoint_rows].tolist()
+      # Capped below the shared pool size so batch tools are not starved meanwhile
+      rows = [row for row in download_pool.map(self._fetch_row, chunk, parallel=self.threads) if row is not None]
+      if rows:
+        self._merge(rows)
+      fetched += len(rows)
+      self._pending = len(stale) - offset - len(chunk)
+      with self._lock:
+        self.fetched_rows += len(rows)
+    with self._lock:
+      self.refreshes += 1
+    logger.debug(f"Screener index refreshed {fetched} of {len(stale)} stale symbols")
+    return fetched
+
+  @staticmethod
+  def _fetch_row(stock_ticker: str) -> dict:
+    try:
+      return screen_row(stock_ticker)
+    except Exception as e:
+      logger.debug(f"Screener refresh failed for {stock_ticker}: {e}")
+      return None
+
+  def refresh_in_background(self, universe: np.ndarray) -> bool:
+    """Start a background refresh when symbols are stale and none is running"""
+    with self._lock:
+      if self._refresh_thread is not None and self._refresh_thread.is_alive():
+        return True
+    if not len(universe) or not len(self.stale_symbols(universe)):
+      return False
+    with self._lock:
+      self._refresh_thread = threading.Thread(target=self.refresh, args=(universe,),
+                                              name="stock-screen-refresh", daemon=True)
+      self._refresh_thread.start()
+    return True
+
+  def screen(self, min_values: dict, max_values: dict, text_filters: dict) -> tuple:
+    """Return (columns, matching row indices) for the given bounds and text filters
+
+    Symbols without a market price are never matched, and a symbol whose
+    value for a bounded field is unknown does not match that bound.
+    """
+    columns = self.columns()
+    with self._lock:
+      self.screens += 1
+    mask = ~np.isnan(columns['price'])
+    with np.errstate(invalid='ignore'):
+      for field, bound in min_values.items():
+        mask &= columns[field] >= bound
+      for field, bound in max_values.items():
+        mask &= columns[field] <= bound
+    for field, value in text_filters.items():
+      mask &= np.char.find(np.char.lower(columns[field]), value.strip().lower()) >= 0
+    return columns, np.flatnonzero(mask)
+
+  def stats(self) -> dict:
+    columns = self.columns()
+    with self._lock:
+      running = self._refresh_thread is not None and self._refresh_thread.is_alive()
+      return {
+        'symbols': len(columns['symbol']),
+        'oldest_age_s': round(float(time.time() - columns['updated_at'].min()), 1) if len(columns['symbol']) else None,
+        'refreshing': running,
+        'pending': self._pending if running else 0,
+        'refreshes': self.refreshes,
+        'fetched_rows': self.fetched_rows,
+        'screens': self.screens,
+      }
+
+
+fundamentals_index = FundamentalsIndex(STOCK_SCREEN_INDEX, refresh_interval=SCREEN_REFRESH_INTERVAL,
+                                       threads=SCREEN_REFRESH_THREADS, checkpoint_rows=SCREEN_CHECKPOINT_ROWS)
+
+
+@stock_mcp.tool()
+@run_in_stock_pool
+def stock_screen(sector: str = None, industry: str = None, min_values: dict[str, float] = None,
+                 max_values: dict[str, float] = None, sort_by: str = "market_cap", descending: bool = True,
+                 limit: int = 25, output_format: str = "text") -> str | ToolResult:
+  """
+  Tool to screen the whole ticker universe by fundamentals, e.g. large-cap technology
+  stocks with a P/E under 25 and a dividend. Runs against a local, periodically refreshed
+  index, so it answers instantly and never looks up each candidate.
+
+  Args:
+      sector: Optional sector to match (case-insensitive substring, e.g. "Technology").
+      industry: Optional industry to match (case-insensitive substring, e.g. "Semiconductors").
+      min_values: Optional lower bounds by field, e.g. {"market_cap": 10, "dividend_yield": 1}.
+      max_values: Optional upper bounds by field, e.g. {"trailing_pe": 25}.
+          Fields: price (USD), market_cap (USD billions), trailing_pe, forward_pe,
+          dividend_yield (%), revenue (USD billions, latest fiscal year),
+          revenue_growth (% year over year), gross_margin, operating_margin, net_margin (%).
+      sort_by: Field to sort the matches by (default "market_cap").
+      descending: Sort from largest to smallest (default True).
+      limit: Maximum number of matches to return (default 25, maximum 200).
+      output_format: "text" (default) or "compact" for structured, column-oriented JSON.
+
+  Returns:
+      str: The number of matches and a CSV table of the top matches.
+  """
+  if output_format not in OUTPUT_FORMATS:
+    return f"Invalid output_format: {output_format}. Use one of: {', '.join(OUTPUT_FORMATS)}."
+  min_values, max_values = min_values or {}, max_values or {}
+  unknown = [field for field in list(min_values) + list(max_values) + [sort_by] if field not in SCREEN_NUMERIC_FIELDS]
+  if unknown:
+    return f"Unknown screener field(s): {', '.join(unknown)}. Use one of: {', '.join(SCREEN_NUMERIC_FIELDS)}."
+  limit = max(1, min(limit, SCREEN_MAX_RESULTS))
+
+  try:
+    refreshing = fundamentals_index.refresh_in_background(symbol_directory.symbols())
+    text_filters = {field: value for field, value in (('sector', sector), ('industry', industry)) if value}
+    columns, matches = fundamentals_index.screen(min_values, max_values, text_filters)
+    indexed = len(columns['symbol'])
+    if not indexed:
+      if refreshing:
+        return "The screener index is being built for the first time. Please try again in a few minutes."
+      return "The screener index is empty. Configure STOCK_SYMBOLS_FILE so the server knows which symbols to index."
+
+    # NaN sorts last in either direction
+    values = columns[sort_by][matches]
+    order = np.argsort(-values if descending else values, kind='stable')
+    top = matches[order[:limit]]
+
+    shown = list(dict.fromkeys(SCREEN_DEFAULT_COLUMNS + tuple(min_values) + tuple(max_values) + (sort_by,)))
+    table = pd.DataFrame({'Symbol': columns['symbol'][top], 'Name': columns['name'][top],
+                          'Sector': columns['sector'][top]})
+    for field in shown:
+      table[field] = columns[field][top]
+    csv_table = table.to_csv(index=False, float_format='%.2f', lineterminator='\n').rstrip('\n')
+
+    age = time.time() - columns['updated_at'].min()
+    note = " A refresh of stale symbols is running in the background." if refreshing else ""
+    text = (f"{len(matches)} of {indexed} indexed symbols match (data up to {age / 3600:.0f}h old).{note}\n"
+            f"Market cap and revenue in USD billions, yields, growth and margins in percent.\n{csv_table}")
+    if output_format == "compact":
+      compact = {'matches': int(len(matches)), 'indexed': indexed}
+      for field in ('symbol', 'name', 'sector'):
+        compact[field] = columns[field][top].tolist()
+      for field in shown:
+        compact[field] = compact_values(columns[field][top])
+      return compact_output(compact, text)
+    return text
+  except Exception as e:
+    logger.error(f"Error in stock_screen: {str(e)}")
+    return f"Error screening stocks: {str(e)}"
+
+@stock_mcp.tool()
+def stock_stats() -> str:
+    """
+    Tool to report stock server cache statistics, useful to confirm that repeated
+    lookups are served locally instead of going to Yahoo Finance.
+
+    Returns:
+        str: Cache statistics in JSON format (entries, hits, misses, hit rate, ...).
+    """
+    stats = {
+        'ticker_info_cache': ticker_info_cache.stats(),
+        'statement_cache': statement_cache.stats(),
+        'symbol_directory': {'symbols': symbol_directory.size},
+        'history_store': history_store.stats(),
+        'worker_pool': stock_worker_pool.stats(),
+        'download_pool': download_pool.stats(),
+        'single_flight': yahoo_singleflight.stats(),
+        'quote_hub': quote_hub.stats(),
+        'compact_output_savings': output_savings.stats(),
+        'fundamentals_index': fundamentals_index.stats(),
+    }
+    return f"Stock server statistics:\n{json.dumps(stats, indent=2)}"
+
 # Example usage:
 # To run the server with sse transport "uv run stock_server.py -t sse"
 if __name__ == "__main__":
   parser = argparse.ArgumentParser(description="stock mcp server")
   parser.add_argument("--transport", "-t", choices=["stdio", "sse", "http"], default="stdio",
                       help="MCP transport to use (stdio or sse or http)")
+  parser.add_argument("--refresh-symbols", action="store_true",
+                      help="download the symbol directory from STOCK_SYMBOLS_SOURCES into STOCK_SYMBOLS_FILE and exit")
+  parser.add_argument("--refresh-screen-index", action="store_true",
+                      help="refresh the stock_screen fundamentals index for every known symbol and exit")
   args = parser.parse_args()
-  stock_mcp.run(transport=args.transport)
+  if args.refresh_symbols:
+    print(f"{symbol_directory.refresh()} symbols written to {symbol_directory.paths[0]}")
+  elif args.refresh_screen_index:
+    if not symbol_directory.size:
+      symbol_directory.refresh()
+    fundamentals_index.refresh(symbol_directory.symbols())
+  else:
+    stock_mcp.run(transport=args.transport)
@@ -2,7 +2,9 @@ from typing import Any
 import httpx
 from fastmcp import FastMCP
 import argparse
+import json
 import logging
+from singleflight import SingleFlight
 
 # Set up logging
 logging.basicConfig(level=logging.DEBUG)
@@ -15,8 +17,16 @@ weather_mcp = FastMCP("weather")
 NWS_API_BASE = "https://api.weather.gov"
 USER_AGENT = "weather-app/1.0"
 
+# Coalesces identical concurrent NWS requests (e.g. the same grid point)
+nws_singleflight = SingleFlight("nws")
+
 
 async def make_nws_request(url: str) -> dict[str, Any] | None:
+  """Make a request to the NWS API, sharing one request among identical concurrent calls."""
+  return await nws_singleflight.do_async(url, _make_nws_request, url)
+
+
+async def _make_nws_request(url: str) -> dict[str, Any] | None:
   """Make a request to the NWS API with proper error handling."""
   headers = {"User-Agent": USER_AGENT, "Accept": "application/geo+json"}
   async with httpx.AsyncClient() as client:
@@ -113,6 +123,17 @@ async def get_forecast(latitude: float, longitude: float) -> str:
 
   return "\n---\n".join(forecasts)
 
+@weather_mcp.tool()
+def weather_stats() -> str:
+  """
+  Tool to report how many NWS requests were deduplicated by request coalescing.
+
+  Returns:
+      str: Request statistics in JSON format (calls, upstream executions, deduplicated, in flight).
+  """
+  stats = {'single_flight': nws_singleflight.stats()}
+  return f"Weather server statistics:\n{json.dumps(stats, indent=2)}"
+
 # Example usage:
 # To run the server with sse transport "uv run weather_server.py -t sse"
 if __name__ == "__main__":